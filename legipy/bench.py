@@ -0,0 +1,206 @@
+# coding: utf-8
+"""
+Parser throughput benchmark
+
+Replays the pages recorded in the test cassettes, and times separately the
+anti-bot check, the soup construction of Service.get, and the parser of
+each page. Results can be saved as a baseline, and later runs compared to
+it to catch performance regressions.
+"""
+import gzip
+import json
+import platform
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from urllib.parse import parse_qs, urlparse
+
+import click
+
+from legipy.parsers.code_parser import CodeParser
+from legipy.parsers.code_parser import parser_articles
+from legipy.parsers.law_parser import parse_law
+from legipy.parsers.legislature_list_parser import parse_legislature_list
+from legipy.parsers.pending_law_list_parser import parse_pending_law_list
+from legipy.parsers.published_law_list_parser import parse_published_law_list
+from legipy.services import anti_bot_message
+from legipy.services import Service
+from legipy.stats import count_objects
+
+
+def _code_parser(match):
+    parser = CodeParser(match.group(1), match.group(2), with_articles=True)
+    return parser.parse_code, ()
+
+
+def _law_list_parser(match, query):
+    if query.get('type') == ['LOI_PUBLIEE']:
+        parser = parse_published_law_list
+    else:
+        parser = parse_pending_law_list
+    return parser, ()
+
+
+# Page URL patterns, and the parser with its extra arguments for a match
+PARSERS = [
+    (r'/liste/code', lambda m, q: (CodeParser.parse_code_list, ())),
+    (r'/codes/texte_lc/(\w+)/([\d-]+)/', lambda m, q: _code_parser(m)),
+    (r'/codes/section_lc/', lambda m, q: (parser_articles, ())),
+    (r'/liste/dossierslegislatifs/', _law_list_parser),
+    (r'/dossierlegislatif/(\w+)/', lambda m, q: (parse_law, (m.group(1),))),
+    (r'/liste/legislatures', lambda m, q: (parse_legislature_list, ())),
+]
+
+
+def load_pages(cassette_dir):
+    """ Yield (name, url, content) for each page recorded in the cassettes """
+    import yaml
+
+    for path in sorted(Path(cassette_dir).iterdir()):
+        with open(path) as f:
+            cassette = yaml.safe_load(f)
+
+        for interaction in cassette['interactions']:
+            response = interaction['response']
+            content = response['body']['string']
+            if isinstance(content, str):
+                content = content.encode('utf-8')
+            if 'gzip' in response['headers'].get('Content-Encoding', []):
+                content = gzip.decompress(content)
+
+            yield path.name, interaction['request']['uri'], content
+
+
+def find_parser(url):
+    parsed = urlparse(url)
+    for pattern, make_parser in PARSERS:
+        match = re.search(pattern, parsed.path)
+        if match:
+            return make_parser(match, parse_qs(parsed.query))
+    return None, ()
+
+
+def _best_time(func, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run_case(service, url, content, parser, args, repeat):
+    """ Time the anti-bot check, soup construction and parser of a page """
+    check, _ = _best_time(lambda: anti_bot_message(content), repeat)
+    soup_time, soup = _best_time(
+        lambda: service.make_soup(content, parser.parse_only), repeat
+    )
+    parse_time, result = _best_time(lambda: parser(url, soup, *args), repeat)
+
+    tracemalloc.start()
+    parser(url, service.make_soup(content, parser.parse_only), *args)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    objects = count_objects(result)
+    total = check + soup_time + parse_time
+    return {
+        'parser': parser.__qualname__,
+        'bytes': len(content),
+        'check': check,
+        'soup': soup_time,
+        'parse': parse_time,
+        'objects': objects,
+        'pages_per_s': 1 / total,
+        'objects_per_s': objects / total,
+        'peak_memory': peak,
+    }
+
+
+def run(cassette_dir, repeat=5, features=None, only=None):
+    service = type('BenchService', (Service,), {'features': features})()
+
+    results = {
+        'python': platform.python_version(),
+        'html_parser': service.parser_features(),
+        'cases': {},
+    }
+    for name, url, content in load_pages(cassette_dir):
+        parser, args = find_parser(url)
+        if parser is None or (only and only not in name):
+            continue
+        results['cases'][name] = run_case(service, url, content, parser,
+                                          args, repeat)
+    return results
+
+
+def compare(results, baseline, threshold):
+    """ Return the cases slower than in the baseline by more than threshold """
+    regressions = []
+    for name, case in results['cases'].items():
+        reference = baseline['cases'].get(name)
+        if reference is None:
+            continue
+        elapsed = case['soup'] + case['parse']
+        ratio = elapsed / (reference['soup'] + reference['parse'])
+        if ratio > 1 + threshold:
+            regressions.append((name, ratio))
+    return regressions
+
+
+def print_results(results, file=sys.stdout):
+    print(f"Python {results['python']}, "
+          f"HTML parser {results['html_parser']}", file=file)
+    print(f"{'page':34} {'parser':32} {'check':>7} {'soup':>8} {'parse':>8}"
+          f" {'pages/s':>8} {'objects/s':>10} {'peak':>8}", file=file)
+    for name, case in results['cases'].items():
+        print(f"{name:34} {case['parser']:32}"
+              f" {case['check'] * 1000:5.1f}ms {case['soup'] * 1000:6.1f}ms"
+              f" {case['parse'] * 1000:6.1f}ms {case['pages_per_s']:8.1f}"
+              f" {case['objects_per_s']:10.0f}"
+              f" {case['peak_memory'] / 2 ** 20:6.1f}MB", file=file)
+
+
+@click.command(short_help='Benchmark the parsers on recorded pages')
+@click.argument('cassettes', default='tests/fixtures/cassettes',
+                type=click.Path(exists=True, file_okay=False))
+@click.option('-n', '--repeat', default=5, show_default=True,
+              help='Runs per page, the best one is kept')
+@click.option('--parser', default=None, metavar='parser',
+              help='HTML parser, default to lxml if available else html5lib',
+              type=click.Choice(['lxml', 'html5lib', 'html.parser']))
+@click.option('-k', '--only', default=None,
+              help='Only run the pages whose cassette name contains this')
+@click.option('--save', type=click.Path(dir_okay=False),
+              help='Save the results as JSON, e.g. as a new baseline')
+@click.option('--compare', 'baseline', type=click.File(),
+              help='Compare to the results saved in a baseline file')
+@click.option('--threshold', default=0.25, show_default=True,
+              help='Relative slowdown reported as a regression')
+@click.help_option('-h')
+def bench(cassettes, repeat, parser, only, save, baseline, threshold):
+    results = run(cassettes, repeat, parser, only)
+    print_results(results)
+
+    if save:
+        with open(save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if baseline:
+        baseline = json.load(baseline)
+        if baseline['html_parser'] != results['html_parser']:
+            print(f"WARNING: baseline uses HTML parser "
+                  f"{baseline['html_parser']}", file=sys.stderr)
+        regressions = compare(results, baseline, threshold)
+        for name, ratio in regressions:
+            print(f'REGRESSION: {name} is {ratio:.2f}x slower than baseline',
+                  file=sys.stderr)
+        if regressions:
+            exit(1)
+
+
+if __name__ == '__main__':
+    bench()
@@ -1,47 +1,76 @@
 #!/usr/bin/env python
 # coding: utf-8
-import datetime
-import json
 import sys
 import os
+import shlex
+import subprocess
 
 import click
 
-from legipy.models.base import LegipyModel
+from legipy import serialize
+from legipy.crawl import Crawler
+from legipy.index import SearchIndex
+from legipy.index import fill_index
 from legipy.services import Service
+from legipy.services.cache import CacheManager
+from legipy.services.cache import CachePolicy
+from legipy.services.cache import ParsedCache
+from legipy.services.cache import cache_dir
+from legipy.services.cache import compress_cache
+from legipy.services.cache import parse_size
 from legipy.services.code_service import CodeService
 from legipy.services.code_service import SectionService
 from legipy.services.law_service import LawService
 from legipy.services.legislature_service import LegislatureService
-from legipy.services.selenium import Browser, WebdriverAdapter
+from legipy.services.pipeline import ParsePool
+from legipy.services.selenium import Browser, HybridAdapter
+from legipy.services.retry import RetryBackoff
+from legipy.services.selenium import WebdriverAdapter
+from legipy.services.throttle import RateLimiter
+from legipy.stats import Stats
 
 
-def json_serial(obj):
-    """JSON serializer for objects not serializable by default json code"""
-    if isinstance(obj, LegipyModel):
-        return obj.to_json()
-    elif isinstance(obj, (datetime.date, datetime.datetime)):
-        return obj.isoformat()
-    raise TypeError(f'Type {repr(type(obj))} not serializable')
+def _output_option(name):
+    return click.get_current_context().find_root().params[name]
+
+
+def _size_option(context, param, value):
+    try:
+        return None if value is None else parse_size(value)
+    except ValueError as error:
+        raise click.BadParameter(str(error))
+
+
+def _ensure_ascii():
+    return not _output_option('utf8')
+
+
+def _dump_line(obj):
+    print(serialize.dumps(obj, compact=True, ensure_ascii=_ensure_ascii()),
+          flush=True)
 
 
 def _dump_item(obj, error=None):
-    if obj:
-        print(json.dumps(obj, sort_keys=True, indent=2, default=json_serial))
+    if obj and _output_option('output_format') == 'ndjson':
+        _dump_line(obj)
+    elif obj:
+        serialize.dump(obj, sys.stdout, compact=_output_option('compact'),
+                       ensure_ascii=_ensure_ascii())
+        print()
     elif error:
         sys.stderr.write(f'ERROR: {error}\n')
         exit(1)
 
 
 def _dump_items(ary):
-    print(
-        json.dumps(
-            [i for i in ary],
-            sort_keys=True,
-            indent=2,
-            default=json_serial
-        )
-    )
+    if _output_option('output_format') == 'ndjson':
+        for item in ary:
+            _dump_line(item)
+        return
+
+    serialize.dump(ary, sys.stdout, compact=_output_option('compact'),
+                   ensure_ascii=_ensure_ascii())
+    print()
 
 
 class Group(click.Group):
@@ -68,33 +97,175 @@ class Group(click.Group):
 @click.group(short_help='Client for the legifrance.gouv.fr website', cls=Group)
 @click.option('-c/-C', '--cache/--no-cache', default=True,
               help='Cache requests locally')
+@click.option('--cache-policy', multiple=True, metavar='kind=ttl',
+              help='Cache duration of a kind of pages: dated, current, '
+                   'codes, legislatures, law-lists, laws or default, e.g. '
+                   'law-lists=30m, dated=never')
+@click.option('--cache-max-size', callback=_size_option, metavar='size',
+              help='Evict the least recently used pages beyond this size, '
+                   'e.g. 2GB')
+@click.option('--cache-max-entries', type=int, default=None,
+              help='Evict the least recently used pages beyond this number')
+@click.option('--cache-pin', multiple=True, metavar='pattern',
+              help='Never evict pages whose URL matches this glob pattern')
+@click.option('--parsed-cache/--no-parsed-cache', default=True,
+              help='Also cache the parsed pages, to skip parsing them again')
+@click.option('--parsed-cache-max-size', callback=_size_option,
+              metavar='size',
+              help='Evict the earliest parsed pages beyond this size')
+@click.option('--index/--no-index', default=False,
+              help='Add the codes and sections fetched to the local search '
+                   'index')
 @click.option('-w/-W', '--webdriver/--no-webdriver',
               default=Browser.check_running(),
               help='Use selenium webdriver')
 @click.option('--driver', default='firefox', metavar='browser',
               help='Browser to control with webdriver',
               type=click.Choice([*Browser.browser_map], case_sensitive=False))
+@click.option('--hybrid/--no-hybrid', default=False,
+              help='Fetch pages over HTTP, using the webdriver browser only '
+                   'to get past the anti-bot page')
+@click.option('--browsers', default=None, type=int,
+              help='Browsers loading pages at once with webdriver, default '
+                   'to the number of the daemon’s')
+@click.option('--parser', default=None, metavar='parser',
+              help='HTML parser, default to lxml if available else html5lib',
+              type=click.Choice(['lxml', 'html5lib', 'html.parser']))
+@click.option('-p', '--processes', default=0, show_default=True,
+              help='Parse pages in this many processes, 0 to parse them in '
+                   'the fetching threads')
+@click.option('-f', '--format', 'output_format', default='json',
+              type=click.Choice(['json', 'ndjson']),
+              help='Output a JSON document, or one JSON object per line')
+@click.option('--compact/--indent', default=False,
+              help='Output JSON without indentation nor sorted keys')
+@click.option('--utf8', is_flag=True, default=False,
+              help='Output non-ASCII characters as UTF-8 instead of \\u '
+                   'escapes, faster with orjson')
+@click.option('--rate', default=2., show_default=True,
+              help='Initial requests per second, adapted to the server’s '
+                   'answers, 0 to disable throttling')
+@click.option('--max-rate', default=10., show_default=True,
+              help='Maximum requests per second')
+@click.option('--burst', default=5, show_default=True,
+              help='Requests allowed at once before throttling')
+@click.option('--pool-size', default=None, type=int,
+              help='Connections kept open to legifrance, at least the number '
+                   'of workers')
+@click.option('--pool-block/--no-pool-block', default=None,
+              help='Wait for a free connection rather than opening one that '
+                   'will be discarded')
+@click.option('--timeout', default=None, type=float,
+              help='Timeout of requests, in seconds')
+@click.option('--non-interactive', is_flag=True, default=False,
+              help='Retry the pages blocked by the anti-bot page after a '
+                   'backoff, in the worker that fetched them, instead of '
+                   'waiting for captchas to be filled in, and report those '
+                   'still blocked')
+@click.option('--captcha-delay', default=30., show_default=True,
+              help='Seconds before retrying a blocked page, doubled at each '
+                   'retry')
+@click.option('--captcha-retries', default=4, show_default=True,
+              help='Retries of a blocked page before giving up')
+@click.option('--on-captcha', default=None, metavar='command',
+              help='Command run with the URL and message of each blocked '
+                   'page, e.g. to notify an operator')
+@click.option('--stats', 'show_stats', is_flag=True, default=False,
+              help='Print the requests, cache hits and time spent fetching '
+                   'and parsing pages to stderr')
+@click.option('--stats-file', default=None, type=click.Path(dir_okay=False),
+              help='Write these statistics as JSON to a file')
 @click.help_option('-h')
 @click.pass_context
-def cli(context, cache, webdriver, driver):
-    if 'daemon' in context.invoked_subcommand.split('-'):
+def cli(context, cache, cache_policy, cache_max_size, cache_max_entries,
+        cache_pin, parsed_cache, parsed_cache_max_size, index, webdriver,
+        driver, hybrid, browsers, parser, processes, output_format, compact,
+        utf8, rate, max_rate, burst, pool_size, pool_block, timeout,
+        non_interactive, captcha_delay, captcha_retries, on_captcha,
+        show_stats, stats_file):
+    if 'daemon' in context.invoked_subcommand.split('-') \
+            or context.invoked_subcommand == 'cache':
         return
 
+    if show_stats or stats_file:
+        stats = Stats()
+        Service.set_stats(stats)
+        context.call_on_close(lambda: _report_stats(stats, show_stats,
+                                                    stats_file))
+
+    if parser:
+        Service.set_parser(parser)
+
+    if processes > 0:
+        pool = ParsePool(processes)
+        Service.set_parse_pool(pool)
+        context.call_on_close(pool.close)
+
+    if rate > 0:
+        Service.set_throttle(RateLimiter(rate, burst, max_rate=max_rate))
+    else:
+        Service.set_throttle(None)
+
+    Service.configure_pool(pool_maxsize=pool_size, pool_block=pool_block,
+                           timeout=timeout)
+
     if cache:
-        Service.add_cache()
+        try:
+            Service.set_cache_policy(CachePolicy.from_options(cache_policy))
+        except ValueError as error:
+            raise click.BadParameter(str(error), param_hint='--cache-policy')
+        Service.add_cache(parsed=parsed_cache, max_size=cache_max_size,
+                          max_entries=cache_max_entries, pinned=cache_pin,
+                          parsed_max_size=parsed_cache_max_size)
+
+    if index:
+        Service.set_index(SearchIndex())
+
+    if non_interactive:
+        retry_backoff = RetryBackoff(captcha_delay, tries=captcha_retries,
+                                     on_captcha=_command_hook(on_captcha))
+        Service.set_retry_backoff(retry_backoff)
+        context.call_on_close(lambda: _report_unresolved(retry_backoff))
+
+    if hybrid:
+        Service.set_adapter(HybridAdapter(driver, browsers))
+    elif webdriver:
+        Service.set_adapter(WebdriverAdapter(driver, browsers))
+
+
+def _command_hook(command):
+    if command is None:
+        return None
 
-    if webdriver:
-        Service.set_adapter(WebdriverAdapter(driver))
+    def hook(url, message):
+        subprocess.run([*shlex.split(command), url, message])
+    return hook
+
+
+def _report_stats(stats, show_stats, stats_file):
+    if show_stats:
+        print(stats.summary(), file=sys.stderr)
+    if stats_file:
+        with open(stats_file, 'w') as f:
+            serialize.dump(dict(stats.to_dict(),
+                                connections=Service.pool_stats()), f)
+
+
+def _report_unresolved(retry_backoff):
+    if retry_backoff.report():
+        exit(1)
 
 
 @cli.command(short_help='Start a browser webdriver in the background')
-def start_daemon():
+@click.option('--workers', default=1, show_default=True,
+              help='Number of browsers, to load pages in parallel')
+def start_daemon(workers):
     if Browser.check_running():
         Browser.stop_running()
-    browser = Browser()
+    browsers = Browser.pool(workers)
     if os.fork():
         os._exit(0)
-    browser.background()
+    browsers[0].background(*browsers[1:])
 
 
 @cli.command(short_help='Stop a webdriver browser running in the background')
@@ -103,10 +274,103 @@ def stop_daemon():
 
 
 @cli.command(short_help='Start a browser webdriver in the foreground')
-def daemon():
+@click.option('--workers', default=1, show_default=True,
+              help='Number of browsers, to load pages in parallel')
+def daemon(workers):
     if Browser.check_running():
         Browser.stop_running()
-    Browser().background()
+    browsers = Browser.pool(workers)
+    browsers[0].background(*browsers[1:])
+
+
+def _size(size):
+    for unit in ['B', 'kB', 'MB']:
+        if size < 1024:
+            return f'{size:.1f}{unit}'
+        size /= 1024
+    return f'{size:.1f}GB'
+
+
+def _cache_path():
+    path = cache_dir() / 'requests_cache.sqlite'
+    if not path.exists():
+        sys.stderr.write(f'ERROR: No cache at {path}\n')
+        exit(1)
+    return path
+
+
+def _parsed_cache():
+    """ The cache of parsed pages, None if there is none """
+    path = cache_dir() / 'parsed_cache.sqlite'
+    return ParsedCache(path) if path.exists() else None
+
+
+@cli.group(short_help='Maintain the local cache')
+def cache():
+    pass
+
+
+@cache.command(short_help='Show the size of the cache')
+@click.option('--pin', multiple=True, metavar='pattern',
+              help='Count the pages whose URL matches this glob pattern')
+def stats(pin):
+    path = _cache_path()
+    stats = CacheManager(path, pinned=pin).stats()
+    print(f"{path}: {stats['entries']} pages, {_size(stats['size'])} "
+          f"({_size(stats['file_size'])} on disk), {stats['expired']} expired"
+          f", {stats['pinned']} pinned, {stats['untracked']} untracked")
+    parsed = _parsed_cache()
+    if parsed is not None:
+        stats = parsed.stats()
+        print(f"{parsed.path}: {stats['entries']} parsed pages, "
+              f"{_size(stats['size'])}")
+
+
+@cache.command(short_help='Delete expired and least recently used pages')
+@click.option('--max-size', callback=_size_option, metavar='size',
+              help='Evict the least recently used pages beyond this size')
+@click.option('--max-entries', type=int, default=None,
+              help='Evict the least recently used pages beyond this number')
+@click.option('--pin', multiple=True, metavar='pattern',
+              help='Never evict pages whose URL matches this glob pattern')
+@click.option('--parsed-max-size', callback=_size_option, metavar='size',
+              help='Evict the earliest parsed pages beyond this size')
+def prune(max_size, max_entries, pin, parsed_max_size):
+    manager = CacheManager(_cache_path(), max_size, max_entries, pin)
+    print(f'Deleted {manager.prune()} pages')
+    parsed = _parsed_cache()
+    if parsed is not None and parsed_max_size:
+        print(f'Deleted {parsed.prune(parsed_max_size)} parsed pages')
+
+
+@cache.command(short_help='Reclaim the space of deleted pages')
+def vacuum():
+    before, after = CacheManager(_cache_path()).vacuum()
+    print(f'Vacuumed: {_size(before)} -> {_size(after)}')
+    parsed = _parsed_cache()
+    if parsed is not None:
+        parsed.vacuum()
+
+
+@cache.command(short_help='Delete all pages, or those matching a pattern')
+@click.option('--pattern', default=None,
+              help='Glob pattern of the URLs to delete, e.g. '
+                   '"*/liste/dossierslegislatifs/*"')
+def clear(pattern):
+    print(f'Deleted {CacheManager(_cache_path()).clear(pattern)} pages')
+    parsed = _parsed_cache()
+    if parsed is not None:
+        print(f'Deleted {parsed.clear(pattern)} parsed pages')
+
+
+@cache.command(short_help='Compress the responses of an existing cache')
+@click.option('--method', type=click.Choice(['zstd', 'zlib']), default=None,
+              help='Compression, default to zstd if installed else zlib')
+def compress(method):
+    count, before, after = compress_cache(_cache_path(), method)
+    saved = 1 - after / before if before else 0
+    print(f'Compressed {count} responses: {_size(before)} -> {_size(after)}'
+          f' ({saved:.0%} saved)')
 
 
 @cli.command(short_help="List published laws")
@@ -114,7 +378,7 @@ def daemon():
 def published_laws(legislature):
     if legislature is None:
         legislature = LegislatureService().current_legislature()
-    _dump_items(LawService().published_laws(legislature))
+    _dump_items(LawService().iter_published_laws(legislature))
 
 
 @cli.command(short_help="List pending law projects")
@@ -122,7 +386,7 @@ def published_laws(legislature):
 def law_projects(legislature):
     if legislature is None:
         legislature = LegislatureService().current_legislature()
-    _dump_items(LawService().pending_laws(legislature, True))
+    _dump_items(LawService().iter_pending_laws(legislature, True))
 
 
 @cli.command(short_help="List pending law proposals")
@@ -130,7 +394,7 @@ def law_projects(legislature):
 def law_proposals(legislature):
     if legislature is None:
         legislature = LegislatureService().current_legislature()
-    _dump_items(LawService().pending_laws(legislature, False))
+    _dump_items(LawService().iter_pending_laws(legislature, False))
 
 
 @cli.command(short_help="List common laws (« lois dites »)")
@@ -154,7 +418,7 @@ def legislatures():
 
 @cli.command(short_help="List applicable codes")
 def codes():
-    _dump_items(CodeService().codes())
+    _dump_items(CodeService().iter_codes())
 
 
 @cli.command(short_help="Show code details")
@@ -163,13 +427,77 @@ def codes():
               help="Publication date (ISO format), default to today")
 @click.option('--with-articles/--without-articles', default=False,
               help="Show details for each articles")
-def code(id_code, date_pub, with_articles):
+@click.option('--fetch-sections/--no-fetch-sections', default=False,
+              help="Fetch each section page for the articles’ history")
+@click.option('-j', '--workers', default=8, show_default=True,
+              help="Number of sections fetched concurrently")
+def code(id_code, date_pub, with_articles, fetch_sections, workers):
     _dump_item(
-        CodeService().code(id_code, date_pub, with_articles),
+        CodeService().code(id_code, date_pub, with_articles, fetch_sections,
+                           workers),
         error=f'No such code: {id_code}'
     )
 
 
+@cli.command(short_help="Show the changes of a code between two dates")
+@click.argument('id-code')
+@click.option('--from', 'date_from', required=True,
+              help="Date of the old version (ISO format)")
+@click.option('--to', 'date_to',
+              help="Date of the new version (ISO format), default to today")
+@click.option('--fetch-sections/--no-fetch-sections', default=True,
+              help="Fetch the sections with new articles for their history")
+@click.option('-j', '--workers', default=8, show_default=True,
+              help="Number of sections fetched concurrently")
+def code_diff(id_code, date_from, date_to, fetch_sections, workers):
+    _dump_item(
+        CodeService().code_diff(id_code, date_from, date_to, fetch_sections,
+                                workers),
+        error=f'No such code: {id_code}'
+    )
+
+
+@cli.command(short_help="Search the articles in the local index")
+@click.argument('query')
+@click.option('--code', 'id_code', metavar='id-code',
+              help="Only search this code")
+@click.option('--date-pub', help="Only search this date (ISO format)")
+@click.option('-n', '--limit', default=20, show_default=True,
+              help="Maximum number of articles")
+@click.option('--fetch-missing', is_flag=True,
+              help="Fetch the code and sections missing from the index, "
+                   "with --code")
+@click.option('-j', '--workers', default=8, show_default=True,
+              help="Number of sections fetched concurrently")
+def search(query, id_code, date_pub, limit, fetch_missing, workers):
+    index = Service.index or SearchIndex()
+    if fetch_missing:
+        if id_code is None:
+            raise click.UsageError('--fetch-missing requires --code')
+        fill_index(index, id_code, date_pub, workers)
+    _dump_items(index.search(query, id_code, date_pub, limit))
+
+
+@cli.command(short_help="Crawl all codes into a directory, resumable")
+@click.argument('output', type=click.Path(file_okay=False))
+@click.option('--date-pub',
+              help="Publication date (ISO format), default to the resumed "
+                   "crawl’s, else today")
+@click.option('--code', 'id_codes', multiple=True, metavar='id-code',
+              help="Only crawl this code, may be repeated")
+@click.option('--fetch-sections/--no-fetch-sections', default=True,
+              help="Fetch each section page for the articles’ history")
+@click.option('-j', '--workers', default=8, show_default=True,
+              help="Number of sections fetched concurrently")
+def crawl(output, date_pub, id_codes, fetch_sections, workers):
+    try:
+        crawler = Crawler(output, date_pub, workers, id_codes, fetch_sections,
+                          compact=_output_option('compact'))
+    except ValueError as error:
+        raise click.BadParameter(str(error), param_hint='--date-pub')
+    crawler.run()
+
+
 @cli.command(short_help="Show code section detail")
 @click.argument('id-code')
 @click.argument('id-section')
@@ -2,6 +2,8 @@
 
 import datetime
 import re
+from collections import deque
+from bs4 import SoupStrainer
 from bs4.element import Tag
 
 DOMAIN = 'www.legifrance.gouv.fr'
@@ -88,14 +90,29 @@ def find_all_non_nested(parent, *args, bfs=False, **kwargs):
     I.e. the same semantics as find_all(..., recursive=True),
     except we don’t search children of matched nodes
     """
-    search = [parent]
+    search = deque([parent])
+    pop = search.popleft if bfs else search.pop
     found = []
     while search:
-        node = search.pop(0 if bfs else -1)
+        node = pop()
         found_at_node = node.find_all(*args, **kwargs, recursive=False)
         found += found_at_node
+        # Compare by identity: Tag equality compares whole subtrees
+        matched = set(map(id, found_at_node))
         search.extend(child for child in node.children if (
-            isinstance(child, Tag) and child not in found_at_node
+            isinstance(child, Tag) and id(child) not in matched
         ))
 
     return found
+
+
+def soup_strainer(*args, **kwargs):
+    """ Declare the only part of the page a parser function needs
+
+    The SoupStrainer built from the arguments is set as the `parse_only`
+    attribute of the parser, for services to build only that subtree.
+    """
+    def decorator(parser):
+        parser.parse_only = SoupStrainer(*args, **kwargs)
+        return parser
+    return decorator
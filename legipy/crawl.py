@@ -0,0 +1,220 @@
+# coding: utf-8
+"""
+Resumable bulk crawl of the codes
+
+The crawl writes to an output directory:
+
+- `codes.json`, the list of codes,
+- `codes/{id_code}.json`, each code with its TOC and articles,
+- `checkpoint`, the completed units, one per line,
+- `crawl.json`, the parameters of the crawl.
+
+While a code is crawled, its TOC is kept in `codes/{id_code}.toc.json` and
+the articles of each fetched section are appended to
+`codes/{id_code}.sections.ndjson`, so that an interrupted crawl resumes
+without fetching again any code, TOC or section it already completed.
+"""
+import datetime
+import json
+import os
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from legipy import serialize
+from legipy.models.code import Article
+from legipy.models.code import Code
+from legipy.models.code import Section
+from legipy.services.code_service import CodeService
+from legipy.services.code_service import SectionService
+from legipy.services.retry import CaptchaError
+
+
+class Crawler(object):
+    def __init__(self, output, date_pub=None, workers=8, id_codes=None,
+                 fetch_sections=True, compact=False, log=sys.stderr):
+        """
+        Prepare the crawl, resuming the one in output if any
+
+        :type  output: str
+        :param output: Output directory
+
+        :type  date_pub: str
+        :param date_pub: Codes date (ISO format), default to the date of the
+                         resumed crawl, else today
+
+        :type  workers: int
+        :param workers: Number of sections fetched concurrently
+
+        :type  id_codes: list
+        :param id_codes: Only crawl these codes, default to all
+
+        :type  fetch_sections: bool
+        :param fetch_sections: Fetch each section page for the articles’
+                               history
+        """
+        self.output = Path(output)
+        self.workers = workers
+        self.id_codes = id_codes
+        self.fetch_sections = fetch_sections
+        self.compact = compact
+        self.log = log
+        self.lock = threading.Lock()
+
+        (self.output / 'codes').mkdir(parents=True, exist_ok=True)
+        manifest = self.output / 'crawl.json'
+        if manifest.exists():
+            with open(manifest) as f:
+                resumed = json.load(f)['date_pub']
+            if date_pub is not None and date_pub != resumed:
+                raise ValueError(f'{output} holds a crawl of {resumed}')
+            date_pub = resumed
+        self.date_pub = date_pub or datetime.date.today().isoformat()
+        with open(manifest, 'w') as f:
+            json.dump({'date_pub': self.date_pub}, f)
+
+        self.completed = set()
+        if self.checkpoint.exists():
+            with open(self.checkpoint) as f:
+                self.completed.update(line.strip() for line in f)
+
+    @property
+    def checkpoint(self):
+        return self.output / 'checkpoint'
+
+    def complete(self, unit):
+        with self.lock:
+            with open(self.checkpoint, 'a') as f:
+                f.write(f'{unit}\n')
+            self.completed.add(unit)
+
+    def write(self, name, obj):
+        """ Write obj as JSON to the output file name, atomically """
+        path = self.output / name
+        tmp = path.with_name(f'.{path.name}.tmp')
+        with open(tmp, 'w') as f:
+            serialize.dump(obj, f, compact=self.compact)
+        os.replace(tmp, path)
+
+    def codes(self):
+        if 'codes' not in self.completed:
+            self.write('codes.json', CodeService().codes())
+            self.complete('codes')
+
+        with open(self.output / 'codes.json') as f:
+            id_codes = [code['id_code'] for code in json.load(f)]
+        if self.id_codes:
+            id_codes = [id_code for id_code in id_codes
+                        if id_code in self.id_codes]
+        return id_codes
+
+    def run(self):
+        id_codes = self.codes()
+        for number, id_code in enumerate(id_codes, 1):
+            if f'code {id_code}' in self.completed:
+                continue
+            print(f'[{number}/{len(id_codes)}] {id_code}', file=self.log)
+            try:
+                self.crawl_code(id_code)
+            except CaptchaError as error:
+                # Given up after its retries, resumed by the next crawl
+                print(f'{id_code} incomplete: {error}', file=self.log)
+
+    def crawl_code(self, id_code):
+        if self.fetch_sections:
+            code = self.toc(id_code)
+            journal = self.output / 'codes' / f'{id_code}.sections.ndjson'
+            fetched = self.load_sections(journal)
+            id_sections = [id_section
+                           for id_section in CodeService.section_pages(code)
+                           if id_section not in fetched]
+            service = SectionService()
+
+            def fetch(id_section):
+                try:
+                    articles = service.articles(id_code, id_section,
+                                                self.date_pub)
+                except CaptchaError as error:
+                    return error
+                line = serialize.dumps({'id_section': id_section,
+                                        'articles': articles}, compact=True)
+                with self.lock, open(journal, 'a') as f:
+                    f.write(f'{line}\n')
+                return articles
+
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                results = list(executor.map(fetch, id_sections))
+            # Other sections are journaled, raise once they are all fetched
+            for result in results:
+                if isinstance(result, CaptchaError):
+                    raise result
+            fetched.update(zip(id_sections, results))
+            CodeService.set_section_articles(code, fetched)
+        else:
+            code = CodeService().code(id_code, self.date_pub,
+                                      with_articles=True)
+
+        self.write(f'codes/{id_code}.json', code)
+        self.complete(f'code {id_code}')
+        if self.fetch_sections:
+            toc = self.output / 'codes' / f'{id_code}.toc.json'
+            for path in (journal, toc):
+                if path.exists():
+                    path.unlink()
+
+    def toc(self, id_code):
+        """ The code with its TOC, fetched once for all the resumed crawls """
+        name = f'codes/{id_code}.toc.json'
+        if f'toc {id_code}' in self.completed:
+            with open(self.output / name) as f:
+                return self.load_code(json.load(f))
+
+        code = CodeService().code(id_code, self.date_pub, with_articles=True)
+        self.write(name, code)
+        self.complete(f'toc {id_code}')
+        return code
+
+    @staticmethod
+    def load_sections(journal):
+        """ Articles by section ID, of the sections already fetched """
+        fetched = {}
+        if not journal.exists():
+            return fetched
+
+        with open(journal) as f:
+            for line in f:
+                try:
+                    section = json.loads(line)
+                except ValueError:
+                    # Line truncated by an interruption
+                    continue
+                fetched[section['id_section']] = [
+                    Article(article['title'], article.get('history'),
+                            article.get('id_article'))
+                    for article in section['articles']
+                ]
+        return fetched
+
+    @classmethod
+    def load_code(cls, data):
+        """ Code, Section or Article model of its JSON data """
+        if 'id_code' in data:
+            model = Code(data['id_code'], data.get('title'),
+                         data.get('subtitle'), data.get('date_pub'),
+                         data.get('url_code'))
+        elif 'id_section' in data:
+            model = Section(data['id_section'], data['title'],
+                            data.get('content'), data.get('articles'),
+                            data.get('url_section'))
+            if isinstance(model.articles, list):
+                model.articles = [cls.load_code(article)
+                                  for article in model.articles]
+        else:
+            return Article(data['title'], data.get('history'),
+                           data.get('id_article'))
+
+        if data.get('children') is not None:
+            model.children = [cls.load_code(child)
+                              for child in data['children']]
+        return model
@@ -0,0 +1,104 @@
+# coding: utf-8
+"""
+Differences between two versions of a code
+
+Versions are compared on their TOCs parsed with articles: articles get a new
+ID in each of their versions, so that a change of an article’s text shows
+as the old version removed and the new one added.
+"""
+from legipy.models.code import Section
+
+
+def _summary(section):
+    return {'id_section': section.id_section, 'title': section.title}
+
+
+def _sections(children):
+    return [child for child in children or [] if isinstance(child, Section)]
+
+
+def index_sections(code):
+    """ Sections of a code by ID, the first one of duplicated IDs """
+    sections = {}
+    for section in code.sections():
+        sections.setdefault(section.id_section, section)
+    return sections
+
+
+def diff_sections(old, new):
+    """
+    Changes of a section between two versions, None if it did not change
+
+    :return: a dict with the section’s ID, title, and the changed parts
+             among old_title, children (the new list of sub-section IDs),
+             added_articles, removed_articles and renamed_articles
+    """
+    changes = {}
+    if old.title != new.title:
+        changes['old_title'] = old.title
+
+    old_children = [child.id_section for child in old.children or []]
+    new_children = [child.id_section for child in new.children or []]
+    if old_children != new_children:
+        changes['children'] = new_children
+
+    old_articles = {a.id_article: a for a in old.articles or []}
+    new_articles = {a.id_article: a for a in new.articles or []}
+    added = [a for key, a in new_articles.items() if key not in old_articles]
+    removed = [a for key, a in old_articles.items() if key not in new_articles]
+    renamed = [{'id_article': key, 'old_title': old_articles[key].title,
+                'title': a.title}
+               for key, a in new_articles.items()
+               if key in old_articles and old_articles[key].title != a.title]
+    if added:
+        changes['added_articles'] = added
+    if removed:
+        changes['removed_articles'] = removed
+    if renamed:
+        changes['renamed_articles'] = renamed
+
+    if not changes:
+        return None
+    return dict(_summary(new), **changes)
+
+
+def diff_codes(old, new):
+    """
+    Compare the TOCs of two versions of a code, parsed with articles
+
+    :return: a dict with the sections added, removed and modified, and
+             children, the new list of top-level section IDs, when they
+             were added, removed or reordered
+    """
+    old_sections = index_sections(old)
+    new_sections = index_sections(new)
+
+    modified = []
+    for id_section, section in new_sections.items():
+        if id_section in old_sections:
+            changes = diff_sections(old_sections[id_section], section)
+            if changes is not None:
+                modified.append(changes)
+
+    diff = {
+        'id_code': new.id_code,
+        'title': new.title,
+        'date_from': old.date_pub,
+        'date_to': new.date_pub,
+        'added_sections': [
+            dict(_summary(section), articles=section.articles or [])
+            for id_section, section in new_sections.items()
+            if id_section not in old_sections
+        ],
+        'removed_sections': [
+            _summary(section) for id_section, section in old_sections.items()
+            if id_section not in new_sections
+        ],
+        'modified_sections': modified,
+    }
+
+    old_children = [child.id_section for child in _sections(old.children)]
+    new_children = [child.id_section for child in _sections(new.children)]
+    if old_children != new_children:
+        diff['children'] = new_children
+    return diff
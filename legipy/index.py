@@ -0,0 +1,210 @@
+# coding: utf-8
+"""
+Local full-text index of the codes’ articles
+
+Codes parsed with articles, and the articles of their section pages, are
+stored in a SQLite FTS5 table, keyed by code, version date, section and
+article, to be searched offline.
+"""
+import datetime
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from legipy.services import Service
+from legipy.services.cache import cache_dir
+from legipy.services.code_service import CodeService
+from legipy.services.code_service import SectionService
+from legipy.services.retry import CaptchaError
+
+SCHEMA = [
+    'CREATE VIRTUAL TABLE IF NOT EXISTS articles USING fts5('
+    '  title, history, section_title, code_title,'
+    '  id_code UNINDEXED, date_pub UNINDEXED, id_section UNINDEXED,'
+    '  id_article UNINDEXED,'
+    "  tokenize = 'unicode61 remove_diacritics 2')",
+    # Sections listing articles, fetched once their page’s articles, with
+    # their history, replaced those of the TOC
+    'CREATE TABLE IF NOT EXISTS sections ('
+    '  id_code TEXT, date_pub TEXT, id_section TEXT, title TEXT,'
+    '  fetched INTEGER, PRIMARY KEY (id_code, date_pub, id_section))',
+]
+
+
+def default_path():
+    return cache_dir() / 'search_index.sqlite'
+
+
+def _quote(query):
+    """ FTS5 query matching all the words of query """
+    return ' '.join('"{}"'.format(word.replace('"', '""'))
+                    for word in query.split())
+
+
+class SearchIndex(object):
+    def __init__(self, path=None):
+        self.path = path or default_path()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self.lock, self.db:
+            for statement in SCHEMA:
+                self.db.execute(statement)
+
+    def index_code(self, code, date_pub):
+        """ Index the articles of a code parsed with articles, replacing
+        those of the same code and date """
+        rows, sections = [], {}
+        for section in code.sections():
+            if section.id_section in sections or not section.articles:
+                continue
+            sections[section.id_section] = (
+                code.id_code, date_pub, section.id_section, section.title,
+                any(article.history for article in section.articles)
+            )
+            rows.extend(self._rows(code.id_code, code.title, date_pub,
+                                   section.id_section, section.title,
+                                   section.articles))
+
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM articles WHERE id_code = ? '
+                            'AND date_pub = ?', (code.id_code, date_pub))
+            self.db.execute('DELETE FROM sections WHERE id_code = ? '
+                            'AND date_pub = ?', (code.id_code, date_pub))
+            self.db.executemany('INSERT INTO sections VALUES (?, ?, ?, ?, ?)',
+                                sections.values())
+            self.db.executemany('INSERT INTO articles VALUES '
+                                '(?, ?, ?, ?, ?, ?, ?, ?)', rows)
+
+    def index_section(self, id_code, date_pub, id_section, articles):
+        """ Index the articles of a section page, replacing those of its
+        TOC
+
+        Section pages also list the articles of their sub-sections, which
+        are indexed with their own section: only the articles of the
+        section’s TOC are kept, unless the section was not indexed.
+        """
+        with self.lock, self.db:
+            own = {id_article for id_article, in self.db.execute(
+                'SELECT id_article FROM articles WHERE id_code = ? '
+                'AND date_pub = ? AND id_section = ?',
+                (id_code, date_pub, id_section)
+            )}
+            if own:
+                articles = [article for article in articles
+                            if article.id_article in own]
+            section_title, = self.db.execute(
+                'SELECT title FROM sections WHERE id_code = ? '
+                'AND date_pub = ? AND id_section = ?',
+                (id_code, date_pub, id_section)
+            ).fetchone() or (None,)
+            code_title, = self.db.execute(
+                'SELECT code_title FROM articles WHERE id_code = ? LIMIT 1',
+                (id_code,)
+            ).fetchone() or (None,)
+            if own:
+                # Articles of the TOC missing from the page are kept
+                self.db.executemany(
+                    'DELETE FROM articles WHERE id_code = ? AND date_pub = ?'
+                    ' AND id_section = ? AND id_article = ?',
+                    [(id_code, date_pub, id_section, article.id_article)
+                     for article in articles]
+                )
+            else:
+                self.db.execute('DELETE FROM articles WHERE id_code = ? '
+                                'AND date_pub = ? AND id_section = ?',
+                                (id_code, date_pub, id_section))
+            self.db.executemany(
+                'INSERT INTO articles VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                self._rows(id_code, code_title, date_pub, id_section,
+                           section_title, articles)
+            )
+            self.db.execute('INSERT OR REPLACE INTO sections '
+                            'VALUES (?, ?, ?, ?, 1)',
+                            (id_code, date_pub, id_section, section_title))
+
+    @staticmethod
+    def _rows(id_code, code_title, date_pub, id_section, section_title,
+              articles):
+        return [(article.title, article.history, section_title, code_title,
+                 id_code, date_pub, id_section, article.id_article)
+                for article in articles]
+
+    def has_code(self, id_code, date_pub):
+        with self.lock:
+            return self.db.execute(
+                'SELECT 1 FROM sections WHERE id_code = ? AND date_pub = ? '
+                'LIMIT 1', (id_code, date_pub)
+            ).fetchone() is not None
+
+    def missing_sections(self, id_code, date_pub):
+        """ IDs of the indexed sections whose page was not fetched """
+        with self.lock:
+            return [id_section for id_section, in self.db.execute(
+                'SELECT id_section FROM sections WHERE id_code = ? '
+                'AND date_pub = ? AND NOT fetched', (id_code, date_pub)
+            )]
+
+    def search(self, query, id_code=None, date_pub=None, limit=20):
+        """
+        Articles matching query, best matches first
+
+        :param query: words to find, or an FTS5 query
+        :return: list of dicts with the article and where it is
+        """
+        conditions, params = '', []
+        if id_code is not None:
+            conditions += ' AND id_code = ?'
+            params.append(id_code)
+        if date_pub is not None:
+            conditions += ' AND date_pub = ?'
+            params.append(date_pub)
+
+        sql = ('SELECT id_code, code_title, date_pub, id_section,'
+               ' section_title, id_article, title, history FROM articles'
+               f' WHERE articles MATCH ?{conditions} ORDER BY rank LIMIT ?')
+        columns = ('id_code', 'code_title', 'date_pub', 'id_section',
+                   'section_title', 'id_article', 'title', 'history')
+        with self.lock:
+            try:
+                rows = self.db.execute(sql, [query, *params, limit])
+                rows = rows.fetchall()
+            except sqlite3.OperationalError:
+                # Not a valid FTS5 query, search its words instead
+                rows = self.db.execute(sql, [_quote(query), *params, limit])
+                rows = rows.fetchall()
+        return [{key: value for key, value in zip(columns, row)
+                 if value is not None} for row in rows]
+
+    def close(self):
+        self.db.close()
+
+
+def fill_index(index, id_code, date_pub=None, workers=8):
+    """
+    Fetch what is missing from the index for a code at a date: the code
+    itself if it was never indexed, then the pages of its sections
+
+    :return: the number of sections fetched
+    """
+    date_pub = date_pub or datetime.date.today().strftime('%Y-%m-%d')
+    previous = Service.index
+    Service.set_index(index)
+    try:
+        if not index.has_code(id_code, date_pub):
+            CodeService().code(id_code, date_pub, with_articles=True)
+
+        id_sections = index.missing_sections(id_code, date_pub)
+        service = SectionService()
+
+        def fetch(id_section):
+            try:
+                service.articles(id_code, id_section, date_pub)
+            except CaptchaError:
+                # Given up after its retries, still missing from the index
+                pass
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(fetch, id_sections))
+    finally:
+        Service.set_index(previous)
+    return len(id_sections)
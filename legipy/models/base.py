@@ -1,10 +1,40 @@
 # coding: utf-8
+import datetime
 
 
 class LegipyModel(object):
+    __slots__ = ()
+
     def to_json(self):
         d = dict()
-        for k, v in self.__dict__.items():
+        for k in self.__slots__:
+            v = getattr(self, k)
             if v is not None:
                 d[k] = v
         return d
+
+    def to_dict(self):
+        """ JSON-ready dict of the fields that are set, recursively """
+        d = dict()
+        for k in self.__slots__:
+            v = getattr(self, k)
+            if v is None:
+                continue
+            elif type(v) is str or type(v) is int:
+                d[k] = v
+            else:
+                d[k] = to_primitive(v)
+        return d
+
+
+def to_primitive(value):
+    """ Convert models, lists and dates to JSON-ready values """
+    if isinstance(value, LegipyModel):
+        return value.to_dict()
+    elif isinstance(value, (list, tuple)):
+        return [to_primitive(v) for v in value]
+    elif isinstance(value, dict):
+        return {k: to_primitive(v) for k, v in value.items()}
+    elif isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    return value
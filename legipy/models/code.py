@@ -4,6 +4,9 @@ from .base import LegipyModel
 
 
 class Code(LegipyModel):
+    __slots__ = ('id_code', 'title', 'subtitle', 'date_pub', 'url_code',
+                 'children')
+
     def __init__(self,
                  id_code,
                  title=None,
@@ -17,8 +20,20 @@ class Code(LegipyModel):
         self.url_code = url_code
         self.children = None
 
+    def sections(self):
+        """ Iterate over all the sections of the code, depth first """
+        stack = [child for child in reversed(self.children or [])
+                 if isinstance(child, Section)]
+        while stack:
+            section = stack.pop()
+            yield section
+            stack.extend(reversed(section.children or []))
+
 
 class Section(LegipyModel):
+    __slots__ = ('id_section', 'title', 'content', 'articles', 'url_section',
+                 'children')
+
     def __init__(self,
                  id_section,
                  title,
@@ -35,6 +50,8 @@ class Section(LegipyModel):
 
 
 class Article(LegipyModel):
+    __slots__ = ('title', 'history', 'id_article')
+
     def __init__(self,
                  title,
                  history,
@@ -4,6 +4,10 @@ from .base import LegipyModel
 
 
 class Law(LegipyModel):
+    __slots__ = ('year', 'legislature', 'number', 'type', 'kind', 'pub_date',
+                 'nor', 'title', 'url_legi', 'id_legi', 'url_an', 'id_an',
+                 'url_senat', 'id_senat', 'common_name')
+
     def __init__(self, year=None, legislature=None, number=None, type=None,
                  kind=None, pub_date=None, title=None, nor=None, url_legi=None,
                  id_legi=None, url_an=None, id_an=None, url_senat=None,
@@ -4,6 +4,8 @@ from .base import LegipyModel
 
 
 class Legislature(LegipyModel):
+    __slots__ = ('number', 'start', 'end')
+
     def __init__(self, number=None, start=None, end=None):
         self.number = number
         self.start = start
@@ -1 +1,5 @@
 # coding: utf-8
+
+# Version of the parsers’ output, to bump whenever it changes so that the
+# outputs stored in the parsed cache are discarded
+PARSER_VERSION = 1
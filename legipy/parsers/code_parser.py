@@ -2,7 +2,10 @@
 import re
 from urllib.parse import urljoin, urldefrag
 
+from bs4.element import Tag
+
 from legipy.common import find_all_non_nested
+from legipy.common import soup_strainer
 from legipy.common import cleanup_url
 from legipy.common import parse_date
 from legipy.common import merge_spaces
@@ -30,6 +33,10 @@ class CodeParser(object):
         self.with_articles = with_articles
         self._section_service = None
 
+    def __repr__(self):
+        return (f'CodeParser({self.id_code!r}, {self.date_pub!r}, '
+                f'with_articles={self.with_articles!r})')
+
     @property
     def section_service(self):
         if self._section_service is None:
@@ -39,13 +46,23 @@ class CodeParser(object):
         return self._section_service
 
     @classmethod
+    @soup_strainer('h2')
     def parse_code_list(cls, url, soup):
-        codes = [code.find('a') for code in soup.find_all('h2')]
-        return [Code(re.sub('^id', '', code.attrs['id']),
+        return list(cls.iter_code_list(url, soup))
+
+    @classmethod
+    @soup_strainer('h2')
+    def iter_code_list(cls, url, soup):
+        codes = (code.find('a') for code in soup.find_all('h2'))
+        return (Code(re.sub('^id', '', code.attrs['id']),
                      code.get_text().strip(),
                      url_code=urljoin(url, code.attrs['href']))
-                for code in codes if code is not None]
+                for code in codes if code is not None)
 
+    # h1.main-title, div.vigor-title and ul#liste-sommaire.summary-list
+    @soup_strainer(attrs={'class': re.compile(
+        r'(^|\s)(main-title|vigor-title|summary-list)(\s|$)'
+    )})
     def parse_code(self, url, soup):
         """
         Parse the code details and TOC from the given HTML content
@@ -73,23 +90,66 @@ class CodeParser(object):
 
         # -- TOC
         toc = soup.find('ul', id='liste-sommaire')
-        code.children = [self.parse_toc_element(url, partie)
-                         for partie in toc.find_all('li', recursive=False)]
+        code.children = self.parse_toc(url, _children(toc, 'li'))
 
         return code
 
-    def parse_toc_element(self, url, li):
-        """Fill the toc item"""
-        a_link = li.find('a', attrs={'class': 'articleLink'}, recursive=False)
+    def parse_toc(self, url, items):
+        """
+        Build the TOC tree below the given li elements, iteratively
+
+        Each node of the TOC is visited once, using an explicit stack instead
+        of recursion, which allows arbitrarily deep codes.
+
+        :type  url: str
+        :param url: source URL of the page
 
-        if a_link:
-            # cleanup_url(urljoin(url, a_link.attrs['href']))
-            return Article(a_link.text.strip(), None,
-                           re.sub('^art', '', a_link.attrs['id']))
+        :type  items: list
+        :param items: li elements of the top level of the TOC
 
-        title = li.find(['span', 'a'], attrs={'class': 'title-link'},
-                        recursive=False)
+        :return: the list of top-level sections and articles
+        """
+        top_level = []
+        sections = []
+        stack = [(li, None) for li in reversed(list(items))]
+        while stack:
+            li, parent = stack.pop()
+            a_link, title, uls = _toc_item_parts(li)
+
+            if a_link is not None:
+                # cleanup_url(urljoin(url, a_link.attrs['href']))
+                node = Article(a_link.text.strip(), None,
+                               re.sub('^art', '', a_link.attrs['id']))
+            else:
+                node, articles = self.parse_toc_title(url, title)
+                sections.append((node, articles))
+                stack.extend((child, node) for ul in reversed(uls)
+                             for child in reversed(_children(ul, 'li')))
+
+            if parent is None:
+                top_level.append(node)
+            elif isinstance(node, Section):
+                if parent.children is None:
+                    parent.children = []
+                parent.children.append(node)
+            elif self.with_articles:
+                if parent.articles is None:
+                    parent.articles = []
+                parent.articles.append(node)
+
+        if not self.with_articles:
+            for section, articles in sections:
+                if not section.children:
+                    section.articles = articles
+
+        return top_level
 
+    def parse_toc_element(self, url, li):
+        """Fill the toc item"""
+        return self.parse_toc(url, [li])[0]
+
+    def parse_toc_title(self, url, title):
+        """ Section from a TOC title, and the range of its articles """
         match = re.match(r'(.*?)(?: \((Articles .*)\))?$',
                          merge_spaces(title.text.strip()))
         title_text, articles = match.groups()
@@ -100,24 +160,40 @@ class CodeParser(object):
             section_url = urldefrag(urljoin(url, title.attrs['href']))[0]
             section.url_section = urljoin(url, section_url)
 
-        for ul in find_all_non_nested(li, 'ul'):
-            for child_node in ul.find_all('li', recursive=False):
-                child = self.parse_toc_element(url, child_node)
-                if isinstance(child, Article) and self.with_articles:
-                    if section.articles is None:
-                        section.articles = []
-                    section.articles.append(child)
-                elif isinstance(child, Section):
-                    if section.children is None:
-                        section.children = []
-                    section.children.append(child)
+        return section, articles
+
+
+def _children(tag, name):
+    """ Same as tag.find_all(name, recursive=False), without the overhead """
+    return [child for child in tag.children
+            if isinstance(child, Tag) and child.name == name]
+
 
-        if not section.children and not self.with_articles:
-            section.articles = articles
+def _toc_item_parts(li):
+    """
+    Find in one pass the article link, title and non-nested lists of a TOC li
 
-        return section
+    I.e. the same as the first a.articleLink and (span|a).title-link children
+    of li, and find_all_non_nested(li, 'ul') in document order.
+    """
+    a_link, title, uls = None, None, []
+    for child in li.children:
+        if not isinstance(child, Tag):
+            continue
+        classes = child.get('class') or ()
+        if a_link is None and child.name == 'a' and 'articleLink' in classes:
+            a_link = child
+        elif title is None and child.name in {'span', 'a'} \
+                and 'title-link' in classes:
+            title = child
+        elif child.name == 'ul':
+            uls.append(child)
+        else:
+            uls.extend(find_all_non_nested(child, 'ul', bfs=True))
+    return a_link, title, uls
 
 
+@soup_strainer('article')
 def parser_articles(url, soup):
     articles = []
     for article in soup.find_all('article'):
@@ -125,7 +201,7 @@ def parser_articles(url, soup):
         title = article.find(['h2', 'h3'])
 
         # or title.attrs['data-anchor']
-        article_id = re.sub('(-[0-9])*$', '', title.attrs['id'])
+        article_id = re.sub('(-[0-9]+)*$', '', title.attrs['id'])
 
         # Only last modification
         history = article.find('p', attrs={'class': 'date'})
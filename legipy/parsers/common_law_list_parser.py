@@ -4,9 +4,11 @@ from urllib.parse import parse_qs, urljoin, urlparse
 
 from legipy.common import cleanup_url
 from legipy.common import merge_spaces
+from legipy.common import soup_strainer
 from legipy.models.law import Law
 
 
+@soup_strainer('div', id='content_right')
 def parse_common_law_list(url, soup):
     results = []
 
@@ -5,9 +5,11 @@ from legipy.common import LAW_KINDS
 from legipy.common import cleanup_url
 from legipy.common import merge_spaces
 from legipy.common import parse_date
+from legipy.common import soup_strainer
 from legipy.models.law import Law
 
 
+@soup_strainer(['h1', 'a'])
 def parse_law(url, soup, id_legi):
     law = Law(
         url_legi=cleanup_url(url),
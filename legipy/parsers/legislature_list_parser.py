@@ -3,9 +3,11 @@ import re
 
 from legipy.common import parse_date
 from legipy.common import parse_roman
+from legipy.common import soup_strainer
 from legipy.models.legislature import Legislature
 
 
+@soup_strainer('h2')
 def parse_legislature_list(url, soup):
     results = []
 
@@ -5,12 +5,17 @@ from urllib.parse import urljoin, urlparse
 from legipy.common import cleanup_url
 from legipy.common import merge_spaces
 from legipy.common import LAW_KINDS
+from legipy.common import soup_strainer
 from legipy.models.law import Law
 
 
+@soup_strainer(['h2', 'ul'])
 def parse_pending_law_list(url, soup, **law_kwargs):
-    results = []
+    return list(iter_pending_law_list(url, soup, **law_kwargs))
 
+
+@soup_strainer(['h2', 'ul'])
+def iter_pending_law_list(url, soup, **law_kwargs):
     for year_header in soup.find_all('h2'):
         year = int(year_header.get_text().strip())
         ul = year_header.find_next('ul')
@@ -24,13 +29,11 @@ def parse_pending_law_list(url, soup, **law_kwargs):
 
             type_loi = re.match(r'(Projet|Proposition)\s+de\s+loi\s+({})?'
                                 .format('|'.join(LAW_KINDS)), link_text)
-            if type_loi:
-                print(type_loi.groups())
 
             url_legi = cleanup_url(urljoin(url, law_entry['href']))
             id_legi = urlparse(url_legi).path.strip('/').split('/')[-1]
 
-            results.append(Law(
+            yield Law(
                 year=year,
                 id_legi=id_legi,
                 type=type_loi.group(0).lower()[:4],
@@ -39,6 +42,4 @@ def parse_pending_law_list(url, soup, **law_kwargs):
                 nor=nor_num.group(1) if nor_num else None,
                 url_legi=url_legi,
                 **law_kwargs
-            ))
-
-    return results
+            )
@@ -5,12 +5,17 @@ from urllib.parse import urljoin
 from legipy.common import cleanup_url
 from legipy.common import merge_spaces
 from legipy.common import parse_date
+from legipy.common import soup_strainer
 from legipy.models.law import Law
 
 
+@soup_strainer(['h2', 'ul'])
 def parse_published_law_list(url, soup, **law_args):
-    results = []
+    return list(iter_published_law_list(url, soup, **law_args))
 
+
+@soup_strainer(['h2', 'ul'])
+def iter_published_law_list(url, soup, **law_args):
     for year_header in soup.find_all('h2'):
         year = int(year_header.get_text().strip())
         ul = year_header.find_next('ul')
@@ -33,7 +38,7 @@ def parse_published_law_list(url, soup, **law_args):
             pub_date = re.match(r'\s*du\s+(\d{1,2}(?:er)?\s+[^\s]+\s+\d{4})',
                                 link_text[len(law_num.group(0)):])
 
-            results.append(Law(
+            yield Law(
                 year=year,
                 number=law_num.group(2),
                 type='law',
@@ -43,6 +48,4 @@ def parse_published_law_list(url, soup, **law_args):
                 url_legi=url_legi,
                 id_legi=id_legi,
                 **law_args
-            ))
-
-    return results
+            )
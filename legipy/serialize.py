@@ -0,0 +1,108 @@
+# coding: utf-8
+import datetime
+import json
+from collections.abc import Iterator
+
+from legipy.models.base import LegipyModel
+from legipy.models.base import to_primitive
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON library used by dumps, orjson when it is installed
+backend = 'orjson' if orjson is not None else 'json'
+
+ASCII = bytes(range(128))
+
+
+def json_serial(obj):
+    """JSON serializer for objects not serializable by default json code"""
+    if isinstance(obj, LegipyModel):
+        return obj.to_json()
+    elif isinstance(obj, (datetime.date, datetime.datetime)):
+        return obj.isoformat()
+    raise TypeError(f'Type {repr(type(obj))} not serializable')
+
+
+def _escape_non_ascii(data):
+    """ Escape the non-ASCII characters of UTF-8 encoded JSON as the json
+    module does, one distinct character at a time """
+    for char in set(data.translate(None, ASCII).decode('utf-8')):
+        data = data.replace(char.encode('utf-8'),
+                            json.dumps(char)[1:-1].encode('ascii'))
+    return data
+
+
+def dumps(obj, compact=False, ensure_ascii=True):
+    """ Serialize obj to a JSON string
+
+    Indented with sorted keys by default, or on a single line with keys in
+    model order if compact. Non-ASCII characters are escaped as with the
+    json module, unless ensure_ascii is False.
+    """
+    if backend == 'orjson':
+        option = 0 if compact else orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS
+        data = orjson.dumps(obj, default=json_serial, option=option)
+        if ensure_ascii:
+            # orjson only writes UTF-8
+            data = _escape_non_ascii(data)
+        return data.decode('utf-8')
+
+    obj = to_primitive(obj)
+    if compact:
+        return json.dumps(obj, separators=(',', ':'),
+                          ensure_ascii=ensure_ascii)
+    return json.dumps(obj, sort_keys=True, indent=2,
+                      ensure_ascii=ensure_ascii)
+
+
+def iterencode(obj, compact=False, ensure_ascii=True):
+    """ Serialize obj to JSON chunks, as dumps(obj, compact, ensure_ascii)
+    would
+
+    Models, lists and iterators are encoded one element at a time, so that
+    memory use is proportional to the depth of a Code tree, not its size.
+    """
+    return _iterencode(obj, '' if compact else '\n', compact, ensure_ascii)
+
+
+def dump(obj, fp, compact=False, ensure_ascii=True):
+    """ Serialize obj as a JSON stream to the file-like object fp """
+    for chunk in iterencode(obj, compact, ensure_ascii):
+        fp.write(chunk)
+
+
+def _is_container(value):
+    return isinstance(value, (LegipyModel, dict, list, tuple, Iterator))
+
+
+def _iterencode(obj, newline, compact, ensure_ascii):
+    if isinstance(obj, LegipyModel):
+        obj = obj.to_json()
+
+    if isinstance(obj, dict) and any(map(_is_container, obj.values())):
+        items = obj.items() if compact else sorted(obj.items())
+        opening, closing = '{', '}'
+    elif isinstance(obj, (list, tuple, Iterator)):
+        items = ((None, value) for value in obj)
+        opening, closing = '[', ']'
+    else:
+        # Leaves, including models without children, are encoded at once
+        chunk = dumps(obj, compact, ensure_ascii)
+        yield chunk if compact else chunk.replace('\n', newline)
+        return
+
+    inner = newline if compact else f'{newline}  '
+    separator = ',' if compact else f',{inner}'
+    empty = True
+    for key, value in items:
+        yield f'{opening}{inner}' if empty else separator
+        empty = False
+        if key is not None:
+            key = json.dumps(str(key), ensure_ascii=ensure_ascii)
+            yield key + (':' if compact else ': ')
+        yield from _iterencode(value, inner, compact, ensure_ascii)
+
+    yield opening + closing if empty else f'{newline}{closing}'
@@ -1,11 +1,67 @@
 # coding: utf-8
 
+import atexit
+import functools
+import re
 import sys
-import appdirs
+import time
+from collections.abc import Iterator
 import requests
 import requests_cache
+from requests.adapters import DEFAULT_POOLBLOCK, DEFAULT_POOLSIZE
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
-from pathlib import Path
+from bs4.builder import builder_registry
+
+from legipy.services.cache import CacheManager
+from legipy.services.cache import CachePolicy
+from legipy.services.cache import CompressedSerializer
+from legipy.services.cache import ParsedCache
+from legipy.services.cache import ParsedItems
+from legipy.services.cache import cache_dir
+
+# Tree builders by order of preference, html5lib being the slowest
+HTML_PARSERS = ('lxml', 'html5lib')
+
+# The anti-bot page’s body holds at most an element with an error message,
+# which is cheaper to find in the raw bytes than in a parsed tree
+ANTI_BOT_PAGE = re.compile(
+    rb'<body[^>]*>\s*(?:<(\w+)[^>]*>([^<]*)</\1>\s*)?</body>', re.I
+)
+# Pages up to this size that the regex lets through are parsed to check
+# their body, in case it is not closed or only holds text
+ANTI_BOT_MAX_SIZE = 4096
+
+
+def anti_bot_message(content):
+    """ Error message of the anti-bot page, None if content is another page
+    """
+    match = ANTI_BOT_PAGE.search(content)
+    if match is not None:
+        return (match.group(2) or b'').decode('utf-8', 'replace').strip()
+    if len(content) > ANTI_BOT_MAX_SIZE:
+        return None
+
+    body = BeautifulSoup(content, 'html5lib', from_encoding='utf-8').body
+    contents = [child for child in body.contents
+                if not isinstance(child, str) or child.strip()]
+    if len(contents) > 1:
+        return None
+    if contents and contents[0].string is not None:
+        return contents[0].string.strip()
+    return ''
+
+
+def make_soup(content, features, parse_only=None):
+    """ BeautifulSoup of a page, built with the given tree builder """
+    builder = builder_registry.lookup(features)
+    if builder is None:
+        raise ValueError(f'HTML parser not available: {features}')
+    if builder.NAME == 'html5lib':
+        # html5lib does not support parse_only, don’t let bs4 warn
+        parse_only = None
+    return BeautifulSoup(content, features, from_encoding='utf-8',
+                         parse_only=parse_only)
 
 
 class Singleton(type):
@@ -18,52 +74,343 @@ class Singleton(type):
         return cls._instances[cls]
 
 
+class LazySoup(object):
+    """ Stand-in for the BeautifulSoup of a page, only built on first use """
+    def __init__(self, service, content, parse_only=None):
+        self.service = service
+        self.content = content
+        self.parse_only = parse_only
+        self._soup = None
+
+    @property
+    def soup(self):
+        if self._soup is None:
+            start = time.perf_counter()
+            self._soup = self.service.make_soup(self.content, self.parse_only)
+            if self.service.stats is not None:
+                self.service.stats.add_time('soup',
+                                            time.perf_counter() - start)
+        return self._soup
+
+    def __getattr__(self, name):
+        return getattr(self.soup, name)
+
+
 class Service(object):
     session = requests.Session()
     domain = 'https://www.legifrance.gouv.fr/'
     retries = 10
+    # Adapter mounted on the domain instead of the pooled HTTPAdapter
+    adapter = None
+    # Connection pool settings of the domain’s HTTPAdapter
+    pool = dict(pool_connections=DEFAULT_POOLSIZE,
+                pool_maxsize=DEFAULT_POOLSIZE, pool_block=DEFAULT_POOLBLOCK)
+    # Default timeout of requests, in seconds
+    timeout = None
+    # Cache duration of pages, used once add_cache was called
+    cache_policy = CachePolicy()
+    # Parser outputs by page content, set by add_cache unless parsed=False
+    parsed_cache = None
+    # Bounds the sqlite cache, set by add_cache
+    cache_manager = None
+    # legipy.index.SearchIndex where parsed codes and sections are added
+    index = None
+    # legipy.services.pipeline.ParsePool running parsers in other processes
+    parse_pool = None
+    # Tree builder, by default the first available one in HTML_PARSERS
+    features = None
+    # legipy.services.throttle.RateLimiter limiting the request rate per
+    # host, None to disable
+    throttle = None
+    # legipy.services.retry.RetryBackoff retrying the pages blocked by the
+    # anti-bot page, instead of waiting for captchas to be filled in
+    retry_backoff = None
+    # legipy.stats.Stats collecting the counts and timings of the requests
+    # and parsers, None to disable
+    stats = None
 
     @classmethod
-    def add_cache(cls, **kwargs):
-        adapter = cls.session.adapters.get(cls.domain)
+    def add_cache(cls, parsed=True, max_size=None, max_entries=None,
+                  pinned=(), parsed_max_size=None, **kwargs):
+        """
+        Cache responses, and parser outputs if parsed
+
+        With the sqlite backend, the least recently used responses are
+        evicted once the cache exceeds max_size bytes or max_entries
+        responses, except those whose URL matches a glob pattern of pinned,
+        and the earliest parser outputs beyond parsed_max_size bytes.
+        """
+        parsed_cache = ':memory:'
         # WebdriverAdapter sets None as HTTP Code
         if kwargs.get('backend', 'sqlite') == 'sqlite':
-            path = Path(appdirs.user_cache_dir('legipy', 'regardscitoyens'))
-            if not path.exists():
-                path.mkdir(parents=True)
-            cache = str(path / 'requests_cache.sqlite')
+            cache = str(cache_dir() / 'requests_cache.sqlite')
+            parsed_cache = cache_dir() / 'parsed_cache.sqlite'
+            kwargs.setdefault('serializer', CompressedSerializer())
+            if cls.cache_manager is not None:
+                cls.cache_manager.close()
+            cls.cache_manager = CacheManager(cache, max_size, max_entries,
+                                             pinned)
         else:
             cache = 'legipy_requests'
 
+        if parsed:
+            cls.parsed_cache = ParsedCache(parsed_cache,
+                                           max_size=parsed_max_size)
+
         kwargs.update(dict(cache_name=cache, allowable_codes=(200, None,)))
         cls.session = requests_cache.CachedSession(**kwargs)
-        if adapter:
-            cls.set_adapter(adapter)
+        cls.mount_adapter()
+
+    @classmethod
+    def flush_cache(cls):
+        """ Write the accesses to the cache recorded since the last flush """
+        if cls.cache_manager is not None:
+            cls.cache_manager.flush()
+
+    @classmethod
+    def set_parse_pool(cls, pool):
+        cls.parse_pool = pool
+
+    @classmethod
+    def set_index(cls, index):
+        cls.index = index
+
+    @classmethod
+    def set_cache_policy(cls, policy):
+        cls.cache_policy = policy
 
     @classmethod
     def set_adapter(cls, adapter):
-        cls.session.mount(cls.domain, adapter)
+        """ Send the domain’s requests with adapter, or with a pooled
+        HTTPAdapter if None
+
+        An HTTPAdapter subclass, e.g. HybridAdapter, gets the connection
+        pool settings of configure_pool, even those set afterwards.
+        """
+        cls.adapter = adapter
+        cls.mount_adapter()
 
-    def get(self, url, *args, **kwargs):
+    @classmethod
+    def configure_pool(cls, pool_connections=None, pool_maxsize=None,
+                       pool_block=None, timeout=None):
+        """
+        Set the connection pool of the domain, kept by add_cache and
+        set_adapter
+
+        :param pool_connections: number of connection pools kept (per host)
+        :param pool_maxsize: number of connections kept open per host
+        :param pool_block: wait for a connection when all are in use instead
+                           of opening connections that are then discarded
+        :param timeout: default timeout of requests, in seconds
+        """
+        settings = dict(pool_connections=pool_connections,
+                        pool_maxsize=pool_maxsize, pool_block=pool_block)
+        cls.pool = dict(cls.pool, **{key: value for key, value
+                                     in settings.items() if value is not None})
+        if timeout is not None:
+            cls.timeout = timeout
+        cls.mount_adapter()
+
+    @classmethod
+    def mount_adapter(cls):
+        if cls.adapter is None:
+            cls.session.mount(cls.domain, HTTPAdapter(**cls.pool))
+            return
+
+        if isinstance(cls.adapter, HTTPAdapter):
+            # Pooled adapters, e.g. HybridAdapter, follow the pool settings
+            pool = (cls.pool['pool_connections'], cls.pool['pool_maxsize'],
+                    cls.pool['pool_block'])
+            adapter = cls.adapter
+            if (adapter._pool_connections, adapter._pool_maxsize,
+                    adapter._pool_block) != pool:
+                adapter.poolmanager.clear()
+                adapter.init_poolmanager(*pool)
+        cls.session.mount(cls.domain, cls.adapter)
+
+    @classmethod
+    def pool_stats(cls):
+        """ Connections opened and requests sent, per host of the domain’s
+        connection pools """
+        adapter = cls.session.get_adapter(cls.domain)
+        if not isinstance(adapter, HTTPAdapter):
+            return {}
+
+        stats = {}
+        pools = adapter.poolmanager.pools
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is None:
+                continue
+            stats[f'{key.key_scheme}://{key.key_host}'] = {
+                'connections': pool.num_connections,
+                'requests': pool.num_requests,
+                'reused': pool.num_requests - pool.num_connections,
+            }
+        return stats
+
+    @classmethod
+    def set_throttle(cls, throttle):
+        cls.throttle = throttle
+
+    @classmethod
+    def set_retry_backoff(cls, retry_backoff):
+        cls.retry_backoff = retry_backoff
+
+    @classmethod
+    def set_stats(cls, stats):
+        cls.stats = stats
+
+    @classmethod
+    def set_parser(cls, features):
+        """ Set the BeautifulSoup tree builder for this service and its
+        subclasses, e.g. 'lxml', 'html.parser' or 'html5lib' """
+        if features is not None and builder_registry.lookup(features) is None:
+            raise ValueError(f'HTML parser not available: {features}')
+        cls.features = features
+
+    @classmethod
+    def parser_features(cls):
+        if cls.features is not None:
+            return cls.features
+        for features in HTML_PARSERS:
+            if builder_registry.lookup(features) is not None:
+                return features
+        return 'html.parser'
+
+    def make_soup(self, content, parse_only=None):
+        return make_soup(content, self.parser_features(), parse_only)
+
+    def update_throttle(self, url, response, anti_bot):
+        # WebdriverAdapter sets None as HTTP code
+        status = response.status_code or 200
+        if getattr(response, 'from_cache', False) and \
+                not getattr(response, 'revalidated', False):
+            # Did not reach the server
+            self.throttle.refund(url)
+        elif anti_bot is not None or status in (403, 429) or status >= 500:
+            self.throttle.failure(url)
+        else:
+            self.throttle.success(url)
+
+    def parse(self, parser, url, soup, *args, **kwargs):
+        """
+        Call parser(url, soup, *args, **kwargs), or return its output for
+        the same page if it is in the parsed cache
+
+        The page is then not parsed by BeautifulSoup at all. Iterators
+        returned by the parser are stored once consumed, and returned from
+        the cache as iterators. With a parse pool, the soup is built and
+        parsed in another process, which returns iterators as lists.
+        """
+        in_thread = self.parsed_cache is None and self.parse_pool is None
+        if not isinstance(soup, LazySoup) or in_thread:
+            return self.run_parser(parser, url, soup, args, kwargs)
+
+        key = None
+        if self.parsed_cache is not None:
+            key = ParsedCache.key(parser, self.parser_features(), url,
+                                  soup.content, args, kwargs)
+            found, result = self.parsed_cache.get(key)
+            if found:
+                if self.stats is not None:
+                    self.stats.count('parsed_cache_hits')
+                if isinstance(result, ParsedItems):
+                    return iter(result)
+                return result
+
+        result = self.run_parser(parser, url, soup, args, kwargs)
+        if key is None:
+            return result
+        if isinstance(result, Iterator):
+            return self._cache_items(key, url, result)
+        self.parsed_cache.set(key, result, url)
+        return result
+
+    def _cache_items(self, key, url, iterator):
+        """ Yield the items of iterator, and store them once all consumed """
+        items = ParsedItems()
+        for item in iterator:
+            items.append(item)
+            yield item
+        self.parsed_cache.set(key, items, url)
+
+    def run_parser(self, parser, url, soup, args, kwargs):
+        """ Run parser in the parse pool if any, else in this thread, timed
+        when collecting stats """
+        if self.parse_pool is not None and isinstance(soup, LazySoup):
+            run = functools.partial(self.parse_pool.parse, parser,
+                                    self.parser_features(), url, soup.content,
+                                    args, kwargs)
+        else:
+            run = functools.partial(parser, url, soup, *args, **kwargs)
+            if self.stats is not None and isinstance(soup, LazySoup):
+                # Build the soup first, to time it apart from the parser
+                soup.soup
+
+        if self.stats is None:
+            return run()
+        return self.stats.parse(parser, run)
+
+    def get(self, url, *args, parse_only=None, **kwargs):
+        if self.timeout is not None:
+            kwargs.setdefault('timeout', self.timeout)
+        if self.cache_policy is not None and hasattr(Service.session, 'cache'):
+            kwargs.setdefault('expire_after',
+                              self.cache_policy.expire_after(url))
         for _ in range(self.retries):
+            if self.throttle is not None:
+                self.throttle.acquire(url)
+            sent = time.monotonic()
+            start = time.perf_counter()
             response = Service.session.get(url, *args, **kwargs)
-            soup = BeautifulSoup(response.content, 'html5lib',
-                                 from_encoding='utf-8')
+            if self.stats is not None:
+                self.stats.add_response(response, time.perf_counter() - start,
+                                        hasattr(Service.session, 'cache'))
+            anti_bot = anti_bot_message(response.content)
+            if anti_bot is not None and self.stats is not None:
+                self.stats.count('anti_bot_pages')
+            if self.throttle is not None:
+                self.update_throttle(url, response, anti_bot)
+
             # If error or valid contents, return the resposne
-            if response.status_code != 200 or len(soup.body.contents) > 1:
-                return response.url, soup
+            if response.status_code != 200 or anti_bot is None:
+                if self.cache_manager is not None:
+                    self.cache_manager.record(response)
+                if self.retry_backoff is not None:
+                    self.retry_backoff.resolve(url)
+                return response.url, LazySoup(self, response.content,
+                                              parse_only)
 
             if hasattr(Service.session, 'cache'):
                 key = Service.session.cache.create_key(response.request)
                 Service.session.cache.delete(key)
 
             err = 'Request unsuccessful.'
-            if len(soup.body.contents) == 1:
-                msg = soup.body.contents[0].string.replace(f"{err} ", "")
+            if anti_bot:
+                msg = anti_bot.replace(f"{err} ", "")
                 err = f'{err[:-1]}: "{msg.strip()}"'
+
+            # A HybridAdapter gets past it with a browser, then retries
+            clear_anti_bot = getattr(self.adapter, 'clear_anti_bot', None)
+            if clear_anti_bot is not None \
+                    and clear_anti_bot(Service.session, url, sent):
+                continue
+
+            if self.retry_backoff is not None:
+                self.retry_backoff.wait(url, err)
+                continue
+
             print(err, file=sys.stderr)
             print(f'Try opening the page and filling any captchas: {url}',
                   file=sys.stderr)
             input()
 
+        if self.retry_backoff is not None:
+            # Out of tries before the retry backoff gave up
+            raise self.retry_backoff.give_up(url, err)
         raise ValueError(f'Too many tries for {url}')
+
+
+# Accesses to the cache are recorded in batches
+atexit.register(Service.flush_cache)
@@ -0,0 +1,69 @@
+# coding: utf-8
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from legipy.services.code_service import CodeService
+from legipy.services.code_service import SectionService
+from legipy.services.law_service import LawService
+from legipy.services.legislature_service import LegislatureService
+
+
+class AsyncService(object):
+    """ Awaitable counterpart of the synchronous services
+
+    Every call runs the blocking fetch and parse of the matching synchronous
+    service in a worker thread, so that the parsers and the shared session
+    (cache, adapters) are used unchanged. At most `max_concurrency` calls
+    run at any time, each sending one request at a time, except code() with
+    fetch_sections, whose call fetches up to `workers` sections at once: up
+    to `max_concurrency` × `workers` requests are then in flight.
+    """
+    def __init__(self, max_concurrency=10):
+        self.max_concurrency = max_concurrency
+        self.executor = ThreadPoolExecutor(max_workers=max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.aclose()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+    async def aclose(self):
+        """ Wait for the pending calls without blocking the event loop """
+        loop = asyncio.get_event_loop()
+        await loop.run_in_executor(None, self.close)
+
+    async def _run(self, func, *args, **kwargs):
+        loop = asyncio.get_event_loop()
+        return await loop.run_in_executor(
+            self.executor, functools.partial(func, *args, **kwargs)
+        )
+
+    async def codes(self):
+        return await self._run(CodeService().codes)
+
+    async def code(self, id_code, date_pub=None, with_articles=False,
+                   fetch_sections=False, workers=8):
+        return await self._run(CodeService().code, id_code, date_pub,
+                               with_articles, fetch_sections, workers)
+
+    async def articles(self, id_code, id_section, date_pub=None):
+        return await self._run(SectionService().articles, id_code, id_section,
+                               date_pub)
+
+    async def published_laws(self, legislature):
+        return await self._run(LawService().published_laws, legislature)
+
+    async def pending_laws(self, legislature, government=True):
+        return await self._run(LawService().pending_laws, legislature,
+                               government)
+
+    async def get_law(self, id_legi):
+        return await self._run(LawService().get_law, id_legi)
+
+    async def legislatures(self):
+        return await self._run(LegislatureService().legislatures)
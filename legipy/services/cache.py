@@ -0,0 +1,565 @@
+# coding: utf-8
+import datetime
+import hashlib
+import pickle
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import urlparse
+
+import appdirs
+from requests_cache import EXPIRE_IMMEDIATELY, NEVER_EXPIRE
+from requests_cache.serializers import SerializerPipeline
+from requests_cache.serializers import pickle_serializer
+
+from legipy.parsers import PARSER_VERSION
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# First bytes of pickles (protocol 2 and later) and zstd frames
+PICKLE_MAGIC = b'\x80'
+ZSTD_MAGIC = b'\x28\xb5\x2f\xfd'
+
+HOUR = 3600
+DAY = 24 * HOUR
+
+# Page kinds, by URL path pattern, the first match wins
+PAGE_KINDS = [
+    ('dated', re.compile(r'/codes/(?:texte|section)_lc/(?:[^/]+/)+'
+                         r'(\d{4}-\d{2}-\d{2})/?$')),
+    ('codes', re.compile(r'/liste/code')),
+    ('legislatures', re.compile(r'/liste/legislatures')),
+    ('law_lists', re.compile(r'/liste/dossierslegislatifs/')),
+    ('laws', re.compile(r'/dossierlegislatif/')),
+]
+
+
+def cache_dir():
+    """ Directory of the cache files, created if needed """
+    path = Path(appdirs.user_cache_dir('legipy', 'regardscitoyens'))
+    if not path.exists():
+        path.mkdir(parents=True)
+    return path
+
+
+def parse_ttl(ttl):
+    """
+    Parse a cache duration: a number of seconds, optionally suffixed with
+    s, m, h or d, or 'never' for pages that never expire
+
+    :return: the duration in seconds, NEVER_EXPIRE or EXPIRE_IMMEDIATELY
+    """
+    ttl = str(ttl).strip().lower()
+    if ttl == 'never':
+        return NEVER_EXPIRE
+
+    match = re.match(r'^(\d+(?:\.\d+)?)([smhd]?)$', ttl)
+    if match is None:
+        raise ValueError(f'Invalid cache duration: {ttl}')
+    seconds = float(match.group(1)) * {
+        '': 1, 's': 1, 'm': 60, 'h': HOUR, 'd': DAY,
+    }[match.group(2)]
+    return int(seconds) if seconds else EXPIRE_IMMEDIATELY
+
+
+def parse_size(size):
+    """ Parse a number of bytes, optionally suffixed with kB, MB or GB """
+    match = re.match(r'^(\d+(?:\.\d+)?)\s*([kmg]?)b?$', str(size).strip(),
+                     re.I)
+    if match is None:
+        raise ValueError(f'Invalid size: {size}')
+    unit = {'': 1, 'k': 2 ** 10, 'm': 2 ** 20, 'g': 2 ** 30}
+    return int(float(match.group(1)) * unit[match.group(2).lower()])
+
+
+class CachePolicy(object):
+    """
+    Cache duration of each page, depending on its kind and date
+
+    Code and section pages of a past date never change, so they never
+    expire, whereas the current version of a code (kind `current`) and the
+    lists of laws are refreshed regularly.
+    """
+    defaults = {
+        'dated': NEVER_EXPIRE,
+        'current': DAY,
+        'codes': DAY,
+        'legislatures': 30 * DAY,
+        'law_lists': HOUR,
+        'laws': DAY,
+        'default': DAY,
+    }
+
+    def __init__(self, **ttls):
+        unknown = set(ttls) - set(self.defaults)
+        if unknown:
+            raise ValueError(f'Unknown page kinds: {", ".join(unknown)}')
+        self.ttls = dict(self.defaults, **{kind: parse_ttl(ttl)
+                                           for kind, ttl in ttls.items()})
+
+    @classmethod
+    def from_options(cls, options):
+        """ Policy from a list of 'kind=ttl' strings """
+        ttls = {}
+        for option in options:
+            kind, sep, ttl = option.partition('=')
+            if not sep:
+                raise ValueError(f'Expected kind=ttl, got: {option}')
+            ttls[kind.strip().replace('-', '_')] = ttl
+        return cls(**ttls)
+
+    @staticmethod
+    def page_kind(url, today=None):
+        path = urlparse(url).path
+        for kind, pattern in PAGE_KINDS:
+            match = pattern.search(path)
+            if match is None:
+                continue
+            if kind == 'dated':
+                today = today or datetime.date.today()
+                if match.group(1) >= today.strftime('%Y-%m-%d'):
+                    return 'current'
+            return kind
+        return 'default'
+
+    def expire_after(self, url, today=None):
+        """ Cache duration of the page at url, in seconds or NEVER_EXPIRE """
+        return self.ttls[self.page_kind(url, today)]
+
+
+class ParsedItems(list):
+    """ Items of an iterator returned by a parser, stored as a list """
+
+
+class ParsedCache(object):
+    """
+    Parser outputs, stored in sqlite as compressed pickles
+
+    Entries are keyed by parser, tree builder, arguments, URL and a hash of
+    the page’s content, so that the output of a parser is reused as long as
+    the page does not change. Entries of another PARSER_VERSION are dropped
+    when the cache is opened. Once the outputs exceed `max_size` bytes, the
+    earliest stored are evicted, checked every `check_every` outputs stored.
+    """
+    def __init__(self, path=':memory:', version=PARSER_VERSION,
+                 max_size=None, check_every=100):
+        self.path = path
+        self.version = version
+        self.max_size = max_size
+        self.check_every = check_every
+        self.stored = 0
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(path), check_same_thread=False)
+        with self.lock, self.db:
+            self.db.execute('CREATE TABLE IF NOT EXISTS parsed '
+                            '(key TEXT PRIMARY KEY, version INTEGER, '
+                            'value BLOB, url TEXT)')
+            columns = [row[1] for row in
+                       self.db.execute('PRAGMA table_info(parsed)')]
+            if 'url' not in columns:
+                # Written by a former version
+                self.db.execute('ALTER TABLE parsed ADD COLUMN url TEXT')
+            self.db.execute('DELETE FROM parsed WHERE version != ?',
+                            (version,))
+
+    @staticmethod
+    def key(parser, features, url, content, args, kwargs):
+        """ Key of a parser’s output, parser being a function or a method
+        whose instance has a repr reflecting its parameters, and features
+        the tree builder of the soup """
+        instance = getattr(parser, '__self__', None)
+        parts = (parser.__module__, parser.__qualname__, repr(instance),
+                 features, url,
+                 hashlib.sha256(content).hexdigest(), repr(args),
+                 repr(sorted(kwargs.items())))
+        return hashlib.sha256(repr(parts).encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        """ Return (found, value) """
+        with self.lock:
+            row = self.db.execute('SELECT value FROM parsed WHERE key = ?',
+                                  (key,)).fetchone()
+        if row is None:
+            return False, None
+        return True, pickle.loads(zlib.decompress(row[0]))
+
+    def set(self, key, value, url=None):
+        blob = zlib.compress(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+        with self.lock, self.db:
+            self.db.execute('INSERT OR REPLACE INTO parsed '
+                            '(key, version, value, url) VALUES (?, ?, ?, ?)',
+                            (key, self.version, blob, url))
+            self.stored += 1
+            prune = self.max_size and self.stored >= self.check_every
+            if prune:
+                self.stored = 0
+        if prune:
+            self.prune()
+
+    def stats(self):
+        with self.lock:
+            entries, size = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) '
+                'FROM parsed'
+            ).fetchone()
+        return {'entries': entries, 'size': size}
+
+    def prune(self, max_size=None):
+        """ Evict the earliest stored outputs beyond max_size bytes, default
+        to the cache’s max_size
+
+        :return: number of outputs deleted
+        """
+        max_size = max_size or self.max_size
+        if not max_size:
+            return 0
+        with self.lock, self.db:
+            size, = self.db.execute('SELECT COALESCE(SUM(LENGTH(value)), 0) '
+                                    'FROM parsed').fetchone()
+            evicted = []
+            rows = self.db.execute('SELECT rowid, LENGTH(value) FROM parsed '
+                                   'ORDER BY rowid')
+            for rowid, length in rows:
+                if size <= max_size:
+                    break
+                evicted.append((rowid,))
+                size -= length
+            self.db.executemany('DELETE FROM parsed WHERE rowid = ?',
+                                evicted)
+        return len(evicted)
+
+    def clear(self, pattern=None):
+        """ Delete all outputs, or those of the pages whose URL matches a
+        glob pattern
+
+        :return: number of outputs deleted
+        """
+        with self.lock, self.db:
+            if pattern is None:
+                return self.db.execute('DELETE FROM parsed').rowcount
+            return self.db.execute('DELETE FROM parsed WHERE url GLOB ?',
+                                   (pattern,)).rowcount
+
+    def vacuum(self):
+        with self.lock:
+            self.db.execute('VACUUM')
+
+    def close(self):
+        self.db.close()
+
+
+class CompressionStage(object):
+    """
+    Serializer stage compressing pickled responses with zstd if installed,
+    else zlib
+
+    Uncompressed pickles, written by the default serializer, are loaded
+    as is, so that existing caches keep working before being compressed.
+    """
+    def __init__(self, method=None):
+        if method is None:
+            method = 'zstd' if zstandard is not None else 'zlib'
+        if method == 'zstd' and zstandard is None:
+            raise ValueError('zstd compression requires zstandard')
+        self.method = method
+
+    def copy(self):
+        return CompressionStage(self.method)
+
+    def dumps(self, value):
+        if self.method == 'zstd':
+            return zstandard.ZstdCompressor(level=3).compress(value)
+        return zlib.compress(value)
+
+    def loads(self, value):
+        value = bytes(value)
+        if value.startswith(PICKLE_MAGIC):
+            return value
+        elif value.startswith(ZSTD_MAGIC):
+            if zstandard is None:
+                raise ValueError('zstd compressed cache requires zstandard')
+            return zstandard.ZstdDecompressor().decompress(value)
+        return zlib.decompress(value)
+
+
+class CompressedSerializer(SerializerPipeline):
+    """ Pickle serializer of requests_cache, followed by compression
+
+    Cache keys depend on the serializer’s name, so it is named as the pickle
+    serializer, keeping existing responses valid once compressed.
+    """
+    def __init__(self, method=None):
+        stage = CompressionStage(method)
+        super().__init__([*pickle_serializer.stages, stage],
+                         name=pickle_serializer.name, is_binary=True)
+
+    def copy(self):
+        return CompressedSerializer(self.stages[-1].method)
+
+    def __str__(self):
+        return str(pickle_serializer)
+
+
+def compress_cache(path, method=None, batch_size=100):
+    """
+    Compress the responses stored uncompressed in the sqlite cache at path,
+    then vacuum it
+
+    Responses are read and compressed `batch_size` at a time, each batch
+    committed apart, to keep memory use and write locks short on large
+    caches.
+
+    :return: number of responses compressed, file sizes before and after
+    """
+    stage = CompressionStage(method)
+    size_before = Path(path).stat().st_size
+    db = sqlite3.connect(str(path))
+    compressed = 0
+    last_key = ''
+    while True:
+        with db:
+            cursor = db.execute('SELECT key, value FROM responses '
+                                'WHERE key > ? ORDER BY key LIMIT ?',
+                                (last_key, batch_size))
+            rows = cursor.fetchmany(batch_size)
+            for key, value in rows:
+                if bytes(value).startswith(PICKLE_MAGIC):
+                    db.execute('UPDATE responses SET value = ? '
+                               'WHERE key = ?',
+                               (stage.dumps(bytes(value)), key))
+                    compressed += 1
+        if len(rows) < batch_size:
+            break
+        last_key = rows[-1][0]
+    db.execute('VACUUM')
+    db.close()
+    return compressed, size_before, Path(path).stat().st_size
+
+
+class CacheManager(object):
+    """
+    Bounds and maintains the sqlite requests cache at path
+
+    The last access to each response is recorded in an `access` table,
+    along with its URL, so that the least recently used responses can be
+    evicted once the cache exceeds `max_size` bytes or `max_entries`
+    responses. Responses whose URL matches one of the `pinned` glob
+    patterns are never evicted. Accesses are written `flush_every` at a
+    time, not to contend with requests_cache for the database.
+
+    Expired responses with a validator (ETag or Last-Modified) are kept when
+    pruning, as requests_cache revalidates them with a conditional request
+    and reuses their body if the server answers 304 Not Modified.
+    """
+    def __init__(self, path, max_size=None, max_entries=None, pinned=(),
+                 check_every=100, flush_every=50):
+        self.path = path
+        self.max_size = max_size
+        self.max_entries = max_entries
+        self.pinned = list(pinned)
+        self.check_every = check_every
+        self.flush_every = flush_every
+        self.stored = 0
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(str(path), timeout=30,
+                                  check_same_thread=False)
+        with self.lock, self.db:
+            # Tables of requests_cache, if it did not create them yet
+            for table in ('responses', 'redirects'):
+                self.db.execute(f'CREATE TABLE IF NOT EXISTS {table} '
+                                '(key TEXT PRIMARY KEY, value BLOB, '
+                                'expires INTEGER)')
+            self.db.execute('CREATE TABLE IF NOT EXISTS access '
+                            '(key TEXT PRIMARY KEY, url TEXT, '
+                            'accessed REAL, validated INTEGER)')
+
+    def _pinned_sql(self):
+        """ SQL condition on access.url matching the pinned patterns, with
+        its parameters """
+        if not self.pinned:
+            return '0', []
+        condition = ' OR '.join('url GLOB ?' for _ in self.pinned)
+        return f'({condition})', list(self.pinned)
+
+    @staticmethod
+    def has_validator(response):
+        return 'ETag' in response.headers \
+            or 'Last-Modified' in response.headers
+
+    def touch(self, key, url, stored=False, validated=False):
+        """ Record an access to a response, and prune the cache once every
+        `check_every` responses stored """
+        prune = False
+        with self.lock:
+            self.pending[key] = (key, url, time.time(), validated)
+            flush = len(self.pending) >= self.flush_every
+            if stored and (self.max_size or self.max_entries):
+                self.stored += 1
+                if self.stored >= self.check_every:
+                    self.stored = 0
+                    prune = True
+        if flush:
+            self.flush()
+        if prune:
+            self.prune()
+
+    def flush(self):
+        """ Write the accesses recorded since the last flush """
+        with self.lock:
+            if not self.pending:
+                return
+            with self.db:
+                self.db.executemany('INSERT OR REPLACE INTO access '
+                                    'VALUES (?, ?, ?, ?)',
+                                    self.pending.values())
+            self.pending.clear()
+
+    def record(self, response):
+        """ Record an access to a response of the cached session """
+        if getattr(response, 'cache_key', None):
+            self.touch(response.cache_key, response.url,
+                       stored=not getattr(response, 'from_cache', False),
+                       validated=self.has_validator(response))
+
+    def sync(self, batch_size=100):
+        """ Add the URL of responses stored before access was recorded,
+        and drop the records of deleted responses
+
+        Only these responses are loaded, `batch_size` at a time. """
+        self.flush()
+        serializer = CompressedSerializer()
+        while True:
+            with self.lock, self.db:
+                missing = self.db.execute(
+                    'SELECT key, value FROM responses WHERE key NOT IN '
+                    '(SELECT key FROM access) LIMIT ?', (batch_size,)
+                ).fetchall()
+                for key, value in missing:
+                    try:
+                        response = serializer.loads(value)
+                        url = response.url
+                        validated = self.has_validator(response)
+                    except Exception:
+                        url, validated = None, False
+                    self.db.execute('INSERT INTO access VALUES (?, ?, 0, ?)',
+                                    (key, url, validated))
+            if len(missing) < batch_size:
+                break
+        with self.lock, self.db:
+            self.db.execute('DELETE FROM access WHERE key NOT IN '
+                            '(SELECT key FROM responses)')
+
+    def stats(self):
+        """ Sizes of the cache, without writing to it
+
+        Responses stored before access was recorded are counted as
+        untracked, their URL being unknown until the next prune or clear.
+        """
+        pinned, params = self._pinned_sql()
+        with self.lock:
+            entries, size, expired, untracked = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0), '
+                '  COALESCE(SUM(expires <= ?), 0), '
+                '  COALESCE(SUM(key NOT IN (SELECT key FROM access)), 0) '
+                'FROM responses', (time.time(),)
+            ).fetchone()
+            pinned_entries, = self.db.execute(
+                'SELECT COUNT(*) FROM access JOIN responses '
+                f'ON access.key = responses.key WHERE {pinned}', params
+            ).fetchone()
+        return {
+            'entries': entries,
+            'size': size,
+            'file_size': Path(self.path).stat().st_size,
+            'expired': expired,
+            'pinned': pinned_entries,
+            'untracked': untracked,
+        }
+
+    def _delete(self, keys):
+        for key in keys:
+            self.db.execute('DELETE FROM responses WHERE key = ?', (key,))
+            self.db.execute('DELETE FROM access WHERE key = ?', (key,))
+        self.db.execute('DELETE FROM redirects WHERE value NOT IN '
+                        '(SELECT key FROM responses)')
+
+    def _within_bounds(self, entries, size):
+        return (not self.max_entries or entries <= self.max_entries) and \
+            (not self.max_size or size <= self.max_size)
+
+    def prune(self, expired=True):
+        """
+        Delete expired responses that can not be revalidated if `expired`,
+        then the least recently used ones until the cache is within bounds
+
+        :return: number of responses deleted
+        """
+        self.sync()
+        deleted = []
+        with self.lock, self.db:
+            if expired:
+                deleted.extend(key for key, in self.db.execute(
+                    'SELECT responses.key FROM responses '
+                    'JOIN access ON access.key = responses.key '
+                    'WHERE expires <= ? AND NOT validated',
+                    (time.time(),)
+                ))
+                self._delete(deleted)
+
+            entries, size = self.db.execute(
+                'SELECT COUNT(*), COALESCE(SUM(LENGTH(value)), 0) '
+                'FROM responses'
+            ).fetchone()
+            pinned, params = self._pinned_sql()
+            rows = self.db.execute(
+                'SELECT access.key, LENGTH(value) FROM access '
+                'JOIN responses ON access.key = responses.key '
+                f'WHERE url IS NULL OR NOT {pinned} ORDER BY accessed',
+                params
+            )
+            evicted = []
+            for key, length in rows:
+                if self._within_bounds(entries, size):
+                    break
+                evicted.append(key)
+                entries -= 1
+                size -= length
+            self._delete(evicted)
+        return len(deleted) + len(evicted)
+
+    def clear(self, pattern=None):
+        """ Delete all responses, or those whose URL matches a glob pattern
+
+        :return: number of responses deleted
+        """
+        self.sync()
+        with self.lock, self.db:
+            if pattern is None:
+                keys = self.db.execute('SELECT key FROM access')
+            else:
+                keys = self.db.execute('SELECT key FROM access '
+                                       'WHERE url GLOB ?', (pattern,))
+            keys = [key for key, in keys]
+            self._delete(keys)
+        return len(keys)
+
+    def vacuum(self):
+        """ Reclaim the space of deleted responses
+
+        :return: file sizes before and after
+        """
+        before = Path(self.path).stat().st_size
+        with self.lock:
+            self.db.execute('VACUUM')
+        return before, Path(self.path).stat().st_size
+
+    def close(self):
+        self.flush()
+        self.db.close()
@@ -1,9 +1,13 @@
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 from legipy.common import page_url
+from legipy.diff import diff_codes
+from legipy.diff import index_sections
 from legipy.parsers.code_parser import CodeParser
 from legipy.parsers.code_parser import parser_articles
 from legipy.services import Singleton, Service
+from legipy.services.retry import CaptchaError
 
 
 class CodeService(Service, metaclass=Singleton):
@@ -11,21 +15,138 @@ class CodeService(Service, metaclass=Singleton):
     code_url = page_url('codes/texte_lc/{id_code}/{date}/')
 
     def codes(self):
+        return list(self.iter_codes())
+
+    def iter_codes(self):
         # https://www.legifrance.gouv.fr/liste/code?etatTexte=VIGUEUR
         # NB: valeurs etatTexte cumulables: VIGUEUR, VIGUEUR_DIFF, ABROGE
         url, soup = self.get(
             self.code_list_url,
+            parse_only=CodeParser.iter_code_list.parse_only,
         )
-        return CodeParser.parse_code_list(url, soup)
+        return self.parse(CodeParser.iter_code_list, url, soup)
 
-    def code(self, id_code, date_pub, with_articles):
+    def code(self, id_code, date_pub, with_articles, fetch_sections=False,
+             workers=8):
         # https://www.legifrance.gouv.fr/codes/texte_lc/LEGITEXT000006075116/2021-04-28/
         date_pub = date_pub or datetime.date.today().strftime('%Y-%m-%d')
         url, soup = self.get(
             self.code_url.format(id_code=id_code, date=date_pub),
+            parse_only=CodeParser.parse_code.parse_only,
         )
         parser = CodeParser(id_code, date_pub, with_articles=with_articles)
-        return parser.parse_code(url, soup)
+        code = self.parse(parser.parse_code, url, soup)
+
+        if with_articles and fetch_sections:
+            self.fetch_sections(code, date_pub, workers)
+        if with_articles and self.index is not None:
+            self.index.index_code(code, date_pub)
+
+        return code
+
+    def fetch_sections(self, code, date_pub, workers=8):
+        """
+        Replace the articles listed in the TOC by the full articles of their
+        section pages, fetching up to `workers` sections concurrently.
+
+        :type  code: legipy.models.code.Code
+        :param code: Code parsed with articles
+
+        :type  date_pub: str
+        :param date_pub: Code Date
+
+        :type  workers: int
+        :param workers: Number of sections fetched concurrently
+        """
+        id_sections = self.section_pages(code)
+        service = SectionService()
+
+        def fetch(id_section):
+            try:
+                return service.articles(code.id_code, id_section, date_pub)
+            except CaptchaError:
+                # Given up after its retries: keep the TOC’s articles
+                return None
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            fetched = {id_section: articles for id_section, articles
+                       in zip(id_sections, executor.map(fetch, id_sections))
+                       if articles is not None}
+
+        self.set_section_articles(code, fetched)
+
+    def code_diff(self, id_code, date_from, date_to=None, fetch_sections=True,
+                  workers=8):
+        """
+        Changes of a code between two dates
+
+        Both TOCs are compared, and with fetch_sections, only the pages of
+        the sections with new articles are fetched, for these articles’
+        history.
+
+        :type  date_from: str
+        :param date_from: Date of the old version (ISO format)
+
+        :type  date_to: str
+        :param date_to: Date of the new version, default to today
+
+        :return: the diff, see legipy.diff.diff_codes
+        """
+        date_to = date_to or datetime.date.today().strftime('%Y-%m-%d')
+        old = self.code(id_code, date_from, with_articles=True)
+        new = self.code(id_code, date_to, with_articles=True)
+        diff = diff_codes(old, new)
+        if not fetch_sections:
+            return diff
+
+        changes = [(section, 'articles') for section in diff['added_sections']]
+        changes.extend((section, 'added_articles')
+                       for section in diff['modified_sections']
+                       if 'added_articles' in section)
+        sections = index_sections(new)
+        # Only the sections with new articles, and a page listing them
+        changes = [(section, key) for section, key in changes if section[key]]
+        changes = [(section, key) for section, key in changes
+                   if sections[section['id_section']].url_section]
+        service = SectionService()
+
+        def fetch(change):
+            try:
+                return service.articles(id_code, change[0]['id_section'],
+                                        date_to)
+            except CaptchaError:
+                # Given up after its retries: keep the TOC’s articles
+                return []
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for (section, key), articles in zip(changes,
+                                                executor.map(fetch, changes)):
+                by_id = {article.id_article: article for article in articles}
+                section[key] = [by_id.get(article.id_article, article)
+                                for article in section[key]]
+        return diff
+
+    @staticmethod
+    def section_pages(code):
+        """ IDs of the sections of a code whose page lists their articles """
+        # Some sections are listed several times in the TOC
+        return list(dict.fromkeys(section.id_section
+                                  for section in code.sections()
+                                  if section.url_section and section.articles))
+
+    @staticmethod
+    def set_section_articles(code, fetched):
+        """ Replace the articles of the TOC by those fetched, by section ID """
+        for section in code.sections():
+            if section.id_section not in fetched or not section.articles:
+                continue
+            articles = fetched[section.id_section]
+            if section.children:
+                # The section page also lists the sub-sections’ articles
+                by_id = {article.id_article: article for article in articles}
+                articles = [by_id.get(article.id_article, article)
+                            for article in section.articles]
+            section.articles = articles
 
 
 class SectionService(Service, metaclass=Singleton):
@@ -36,6 +157,10 @@ class SectionService(Service, metaclass=Singleton):
         date_pub = date_pub or datetime.date.today().strftime('%Y-%m-%d')
         url, soup = self.get(
             self.section_url.format(id_code=id_code, id_section=id_section,
-                                    date=date_pub)
+                                    date=date_pub),
+            parse_only=parser_articles.parse_only,
         )
-        return parser_articles(url, soup)
+        articles = self.parse(parser_articles, url, soup)
+        if self.index is not None:
+            self.index.index_section(id_code, date_pub, id_section, articles)
+        return articles
@@ -1,8 +1,8 @@
 # coding: utf-8
 from legipy.common import page_url
 from legipy.parsers.law_parser import parse_law
-from legipy.parsers.pending_law_list_parser import parse_pending_law_list
-from legipy.parsers.published_law_list_parser import parse_published_law_list
+from legipy.parsers.pending_law_list_parser import iter_pending_law_list
+from legipy.parsers.published_law_list_parser import iter_published_law_list
 from legipy.services import Singleton, Service
 
 
@@ -12,24 +12,35 @@ class LawService(Service, metaclass=Singleton):
     comm_url = None
 
     def pending_laws(self, legislature, government=True):
+        return list(self.iter_pending_laws(legislature, government))
+
+    def iter_pending_laws(self, legislature, government=True):
         url, soup = self.get(
             self.pub_url.format(legislature=legislature),
-            params={'type': 'PROJET_LOI' if government else 'PROPOSITION_LOI'}
+            params={'type': 'PROJET_LOI' if government else 'PROPOSITION_LOI'},
+            parse_only=iter_pending_law_list.parse_only,
         )
-        return parse_pending_law_list(url, soup, legislature=legislature)
+        return self.parse(iter_pending_law_list, url, soup,
+                          legislature=legislature)
 
     def published_laws(self, legislature):
+        return list(self.iter_published_laws(legislature))
+
+    def iter_published_laws(self, legislature):
         url, soup = self.get(
             self.pub_url.format(legislature=legislature),
-            params={'type': 'LOI_PUBLIEE'}
+            params={'type': 'LOI_PUBLIEE'},
+            parse_only=iter_published_law_list.parse_only,
         )
-        return parse_published_law_list(url, soup, legislature=legislature)
+        return self.parse(iter_published_law_list, url, soup,
+                          legislature=legislature)
 
     def common_laws(self):
         raise NotImplementedError('Common laws not updated to 2020 format')
 
     def get_law(self, id_legi):
         url, soup = self.get(
-            self.law_url.format(id_legi=id_legi)
+            self.law_url.format(id_legi=id_legi),
+            parse_only=parse_law.parse_only,
         )
-        return parse_law(url, soup, id_legi)
+        return self.parse(parse_law, url, soup, id_legi)
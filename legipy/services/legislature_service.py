@@ -11,8 +11,9 @@ class LegislatureService(Service, metaclass=Singleton):
 
     def legislatures(self):
         if self.cache is None:
-            url, soup = self.get(self.url)
-            self.cache = parse_legislature_list(url, soup)
+            url, soup = self.get(self.url,
+                                 parse_only=parse_legislature_list.parse_only)
+            self.cache = self.parse(parse_legislature_list, url, soup)
 
         return self.cache
 
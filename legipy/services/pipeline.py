@@ -0,0 +1,42 @@
+# coding: utf-8
+from collections.abc import Iterator
+from concurrent.futures import ProcessPoolExecutor
+
+from legipy.services import make_soup
+
+
+def parse_page(parser, features, url, content, args, kwargs):
+    """ Build the soup of a page and run parser on it, in a worker process
+
+    Models are sent back pickled, iterators as lists.
+    """
+    soup = make_soup(content, features, getattr(parser, 'parse_only', None))
+    result = parser(url, soup, *args, **kwargs)
+    if isinstance(result, Iterator):
+        result = list(result)
+    return result
+
+
+class ParsePool(object):
+    """ Processes building the soups and running the parsers of pages
+
+    Once set with Service.set_parse_pool, the threads fetching pages, such
+    as those of CodeService.fetch_sections or the crawler, only download
+    them and wait for their parsing in one of the processes, so that
+    parsing is spread over all cores instead of holding the GIL.
+    """
+    def __init__(self, processes=None):
+        self.executor = ProcessPoolExecutor(max_workers=processes)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def parse(self, parser, features, url, content, args=(), kwargs=None):
+        return self.executor.submit(parse_page, parser, features, url,
+                                    content, args, kwargs or {}).result()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
@@ -0,0 +1,86 @@
+# coding: utf-8
+import sys
+import threading
+import time
+
+
+class CaptchaError(ValueError):
+    """ A page still blocked by the anti-bot protection """
+    def __init__(self, url, message):
+        super(CaptchaError, self).__init__(f'{message} {url}')
+        self.url = url
+        self.message = message
+
+
+class RetryBackoff(object):
+    """ Requests blocked by the anti-bot page, retried with exponential
+    backoff instead of waiting for captchas to be filled in
+
+    A blocked request waits `delay` seconds, multiplied by `factor` at each
+    new block up to `max_delay`. The wait blocks the thread sending the
+    request: the other workers of a concurrent command go on meanwhile, but
+    a serial one waits up to the sum of the backoffs per blocked URL, 7.5
+    minutes by default. After `tries` retries, or once out of
+    Service.retries, its URL is given up and kept in `unresolved`.
+    """
+    def __init__(self, delay=30., factor=2., max_delay=600., tries=4,
+                 on_captcha=None):
+        """
+        :param on_captcha: Called with the URL and the error message when a
+                           URL is first blocked, e.g. to notify an operator
+        """
+        self.delay = delay
+        self.factor = factor
+        self.max_delay = max_delay
+        self.tries = tries
+        self.on_captcha = on_captcha
+        self.lock = threading.Lock()
+        # Number of blocks by URL being retried
+        self.blocked = {}
+        # Error message by URL given up
+        self.unresolved = {}
+
+    def backoff(self, blocks):
+        return min(self.max_delay, self.delay * self.factor ** (blocks - 1))
+
+    def wait(self, url, message):
+        """ Wait before retrying a blocked URL, raise CaptchaError once it was
+        retried too many times """
+        with self.lock:
+            blocks = self.blocked.get(url, 0) + 1
+            if blocks > self.tries:
+                raise self._give_up(url, message)
+            self.blocked[url] = blocks
+
+        if blocks == 1 and self.on_captcha is not None:
+            self.on_captcha(url, message)
+        time.sleep(self.backoff(blocks))
+
+    def give_up(self, url, message):
+        """ Keep url as unresolved, return the CaptchaError to raise """
+        with self.lock:
+            return self._give_up(url, message)
+
+    def _give_up(self, url, message):
+        self.blocked.pop(url, None)
+        self.unresolved[url] = message
+        return CaptchaError(url, message)
+
+    def resolve(self, url):
+        """ The URL got through """
+        with self.lock:
+            self.blocked.pop(url, None)
+            self.unresolved.pop(url, None)
+
+    def report(self, file=None):
+        """ Print the URLs given up, to stderr by default, return their
+        number """
+        file = file or sys.stderr
+        with self.lock:
+            unresolved = dict(self.unresolved)
+        if unresolved:
+            print(f'{len(unresolved)} pages blocked by the anti-bot page:',
+                  file=file)
+            for url, message in unresolved.items():
+                print(f'  {url} ({message})', file=file)
+        return len(unresolved)
@@ -5,12 +5,15 @@ import io
 import sys
 import json
 import errno
+import queue
 import signal
 import atexit
+import contextlib
 import appdirs
 import urllib3
 import requests
 import threading
+import time
 import http.cookiejar
 from collections.abc import Iterable
 from pathlib import Path
@@ -18,6 +21,8 @@ from pathlib import Path
 from selenium import webdriver
 from selenium.webdriver.remote.command import Command
 
+from legipy.services import anti_bot_message
+
 
 class RemoteDaemon(webdriver.Remote):
     """ Communicate with a running instance of a browser
@@ -49,11 +54,16 @@ class Browser(object):
     path = Path(appdirs.user_cache_dir('legipy', 'regardscitoyens')) \
         / 'selenium.json'
 
-    def __init__(self, driver_name='firefox'):
-        session_data = None
-        if os.path.exists(self.path):
-            with open(self.path) as f:
-                session_data = json.load(f)
+    def __init__(self, driver_name='firefox', session_data=None):
+        """
+        Connect to a session of the daemon, else launch a browser
+
+        :type  session_data: dict
+        :param session_data: Session to connect to, default to the first
+                             one saved by the daemon
+        """
+        if session_data is None:
+            session_data = next(iter(self.saved_sessions()), None)
 
         try:
             if session_data:
@@ -63,26 +73,65 @@ class Browser(object):
                 self.driver = driver
         except Exception as err:
             print('Failed accessing daemon', err, file=sys.stderr)
-            os.unlink(self.path)
+            self._unlink()
         except urllib3.exceptions.MaxRetryError:
-            os.unlink(self.path)
+            self._unlink()
 
         if not hasattr(self, 'driver'):
             self.driver = self.browser_map[driver_name]()
             atexit.register(self.driver.quit)
 
-    def background(self):
-        """ Background work: save infos for remote to file, wait & clean up """
+    @classmethod
+    def pool(cls, workers=None, driver_name='firefox'):
+        """ Browsers connected to the daemon’s sessions, completed with new
+        ones up to workers, default to as many as the daemon has or one """
+        sessions = cls.saved_sessions()
+        workers = workers or len(sessions) or 1
+        sessions = sessions[:workers]
+        return [cls(driver_name, session_data) for session_data in sessions] \
+            + [cls(driver_name, {})  # No session: launch a browser
+               for _ in range(workers - len(sessions))]
+
+    @classmethod
+    def saved_sessions(cls):
+        """ Sessions saved by the daemon, either a list of sessions or, as
+        saved by former versions, a single one """
+        if not os.path.exists(cls.path):
+            return []
+        with open(cls.path) as f:
+            data = json.load(f)
+        if 'sessions' in data:
+            return data['sessions']
+        return [data]
+
+    @classmethod
+    def _unlink(cls):
+        try:
+            os.unlink(cls.path)
+        except FileNotFoundError:
+            pass
+
+    def session_data(self):
+        return {
+            'url': self.driver.command_executor._url,
+            'session_id': self.driver.session_id,
+            'capabilities': self.driver.desired_capabilities,
+            'w3c': self.driver.w3c,
+        }
+
+    def background(self, *others):
+        """ Background work: save infos for remote to file, wait & clean up
+
+        Sessions of the other browsers are saved along, for a pool of them
+        """
         if not self.path.parent.exists():
             self.path.parent.mkdir(parents=True)
 
         with open(self.path, 'w') as f:
             json.dump({
                 'pid': os.getpid(),
-                'url': self.driver.command_executor._url,
-                'session_id': self.driver.session_id,
-                'capabilities': self.driver.desired_capabilities,
-                'w3c': self.driver.w3c,
+                'sessions': [browser.session_data()
+                             for browser in (self, *others)],
             }, f)
 
         exit = threading.Event()
@@ -106,12 +155,12 @@ class Browser(object):
         except FileNotFoundError:
             pass
         except (KeyError, ValueError):
-            os.unlink(cls.path)
+            cls._unlink()
         except OSError as err:
             # Possible error with valid pid
             if err.errno == errno.EPERM:
                 return True
-            os.unlink(cls.path)
+            cls._unlink()
         return False
 
     @classmethod
@@ -124,11 +173,19 @@ class Browser(object):
 
 
 class WebdriverAdapter(requests.adapters.BaseAdapter):
-    """ Send get requests via the Browser’s """
-    def __init__(self, *args, **kwargs):
+    """ Send get requests via a pool of Browsers, each request to a free one
+    """
+    def __init__(self, driver_name='firefox', workers=None):
+        """
+        :type  workers: int
+        :param workers: Number of browsers loading pages at once, default to
+                        the number of sessions of the daemon, or one
+        """
         super(WebdriverAdapter, self).__init__()
-        self.browser = Browser(*args, **kwargs)
-        self.driver = self.browser.driver
+        self.browsers = Browser.pool(workers, driver_name)
+        self.free = queue.Queue()
+        for browser in self.browsers:
+            self.free.put(browser)
 
     def close(self):
         pass
@@ -141,15 +198,28 @@ class WebdriverAdapter(requests.adapters.BaseAdapter):
         if request.method.upper() != 'GET':
             raise ValueError('WebdriverAdapter only supports get requests')
 
+        with self.borrow() as browser:
+            return self.load(browser.driver, request, timeout)
+
+    @contextlib.contextmanager
+    def borrow(self):
+        """ Wait for a free browser, and use it until the end of the block """
+        browser = self.free.get()
+        try:
+            yield browser
+        finally:
+            self.free.put(browser)
+
+    def load(self, driver, request, timeout=None):
         if timeout and isinstance(timeout, Iterable):
             timeout = sum(timeout)
         if timeout:
-            self.driver.set_page_load_timeout(timeout)
+            driver.set_page_load_timeout(timeout)
 
-        self.driver.get(request.url)
+        driver.get(request.url)
         response = requests.models.Response()
         response.request = request
-        response.url = self.driver.current_url
+        response.url = driver.current_url
 
         # Things we can’t have :(
         response.status_code = None
@@ -157,14 +227,17 @@ class WebdriverAdapter(requests.adapters.BaseAdapter):
 
         # Miraculously cookies are available
         jar = requests.cookies.RequestsCookieJar()
-        for cookie in self.driver.get_cookies():
+        for cookie in driver.get_cookies():
             jar.set_cookie(self.to_cookielib_cookie(cookie))
         response.cookies = jar
 
-        # Set data with default encoding as 'raw'
+        # Set data with default encoding as 'raw', in a urllib3 response as
+        # requests_cache expects
         response.encoding = 'utf-8'
-        page_bytes = self.driver.page_source.encode(response.encoding)
-        response.raw = io.BytesIO(page_bytes)
+        page_bytes = driver.page_source.encode(response.encoding)
+        response.raw = urllib3.HTTPResponse(io.BytesIO(page_bytes),
+                                            preload_content=False,
+                                            request_url=response.url)
 
         return response
 
@@ -192,3 +265,57 @@ class WebdriverAdapter(requests.adapters.BaseAdapter):
             rest=None,
             rfc2109=False
         )
+
+
+class HybridAdapter(requests.adapters.HTTPAdapter):
+    """ Send requests over HTTP, going through a browser only to get past the
+    anti-bot page, whose cookies then let the session’s requests through """
+    def __init__(self, driver_name='firefox', workers=None, **kwargs):
+        """
+        :param driver_name: Browser, launched once first needed unless the
+                            daemon runs
+        :param kwargs: Connection pool settings of the HTTPAdapter, replaced
+                       by those of Service.configure_pool once mounted by
+                       Service.set_adapter
+        """
+        super(HybridAdapter, self).__init__(**kwargs)
+        self.driver_name = driver_name
+        self.workers = workers
+        self.webdriver = None
+        self.lock = threading.Lock()
+        self.cleared = None
+
+    def clear_anti_bot(self, session, url, since=None):
+        """
+        Load url in a browser, and copy its cookies and user agent to session
+
+        Requests blocked at once get past the anti-bot page once: the browser
+        is skipped when it was cleared after since.
+
+        :param since: time.monotonic() when the blocked request was sent
+        :return: whether the browser got past the anti-bot page
+        """
+        with self.lock:
+            if since is not None and self.cleared is not None \
+                    and self.cleared > since:
+                return True
+
+            if self.webdriver is None:
+                self.webdriver = WebdriverAdapter(self.driver_name,
+                                                  self.workers)
+            with self.webdriver.borrow() as browser:
+                driver = browser.driver
+                driver.get(url)
+                page_bytes = driver.page_source.encode('utf-8')
+                if anti_bot_message(page_bytes) is not None:
+                    return False
+
+                for cookie in driver.get_cookies():
+                    session.cookies.set_cookie(
+                        WebdriverAdapter.to_cookielib_cookie(cookie)
+                    )
+                session.headers['User-Agent'] = driver.execute_script(
+                    'return navigator.userAgent'
+                )
+            self.cleared = time.monotonic()
+            return True
@@ -0,0 +1,82 @@
+# coding: utf-8
+import threading
+import time
+from urllib.parse import urlparse
+
+
+class _Bucket(object):
+    __slots__ = ('tokens', 'updated', 'rate', 'streak')
+
+    def __init__(self, tokens, rate):
+        self.tokens = tokens
+        self.updated = time.monotonic()
+        self.rate = rate
+        self.streak = 0
+
+
+class RateLimiter(object):
+    """ Per-host token bucket, whose rate adapts to the server’s answers
+
+    Each host gets `burst` tokens, refilled at `rate` tokens per second.
+    The rate is multiplied by `backoff` whenever a request is blocked or
+    fails, and by `recovery` after `successes` consecutive successful
+    requests, staying between `min_rate` and `max_rate`.
+    """
+    def __init__(self, rate=2., burst=5, min_rate=.1, max_rate=10.,
+                 backoff=.5, recovery=1.2, successes=20):
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate
+        self.max_rate = max(max_rate, rate)
+        self.backoff = backoff
+        self.recovery = recovery
+        self.successes = successes
+        self.lock = threading.Lock()
+        self.hosts = {}
+
+    def _bucket(self, url):
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = _Bucket(self.burst, self.rate)
+        return self.hosts[host]
+
+    def current_rate(self, url):
+        with self.lock:
+            return self._bucket(url).rate
+
+    def acquire(self, url):
+        """ Wait until a request to the url’s host is allowed """
+        while True:
+            with self.lock:
+                bucket = self._bucket(url)
+                now = time.monotonic()
+                refill = (now - bucket.updated) * bucket.rate
+                bucket.tokens = min(self.burst, bucket.tokens + refill)
+                bucket.updated = now
+                if bucket.tokens >= 1:
+                    bucket.tokens -= 1
+                    return
+                wait = (1 - bucket.tokens) / bucket.rate
+            time.sleep(wait)
+
+    def refund(self, url):
+        """ Give back the token of a request that did not reach the host """
+        with self.lock:
+            bucket = self._bucket(url)
+            bucket.tokens = min(self.burst, bucket.tokens + 1)
+
+    def success(self, url):
+        with self.lock:
+            bucket = self._bucket(url)
+            bucket.streak += 1
+            if bucket.streak >= self.successes:
+                bucket.rate = min(self.max_rate, bucket.rate * self.recovery)
+                bucket.streak = 0
+
+    def failure(self, url):
+        """ Slow down, and drop the tokens accumulated at the former rate """
+        with self.lock:
+            bucket = self._bucket(url)
+            bucket.tokens = 0
+            bucket.rate = max(self.min_rate, bucket.rate * self.backoff)
+            bucket.streak = 0
@@ -0,0 +1,152 @@
+# coding: utf-8
+"""
+Performance statistics of a run
+
+Once set with Service.set_stats(), a Stats instance counts the requests,
+the cache hits and misses, the bytes downloaded and the anti-bot pages met,
+and times the network, the soup construction and each parser, with the
+number of objects parsed, to tell where a run spends its time:
+
+    stats = Stats()
+    Service.set_stats(stats)
+    CodeService().code('LEGITEXT000006074069', None, with_articles=True)
+    print(stats.summary())
+"""
+import threading
+import time
+from collections import Counter
+from collections.abc import Iterator
+
+from legipy.models.base import LegipyModel
+
+
+def count_objects(result):
+    """ Number of models in the parser output, nested ones included """
+    if isinstance(result, LegipyModel):
+        return 1 + sum(count_objects(getattr(result, slot))
+                       for slot in result.__slots__)
+    elif isinstance(result, list):
+        return sum(count_objects(item) for item in result)
+    return 0
+
+
+def _parser_name(parser):
+    return getattr(parser, '__qualname__', None) or repr(parser)
+
+
+class Stats(object):
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.perf_counter()
+        self.counters = Counter()
+        # Seconds by step: network, cache, soup
+        self.timings = Counter()
+        # Calls, seconds and objects by parser name
+        self.parsers = {}
+
+    def count(self, name, value=1):
+        with self.lock:
+            self.counters[name] += value
+
+    def add_time(self, name, seconds):
+        with self.lock:
+            self.timings[name] += seconds
+
+    def add_response(self, response, seconds, cached_session=False):
+        """ Count a response of Service.session, received in seconds """
+        from_cache = getattr(response, 'from_cache', False)
+        revalidated = getattr(response, 'revalidated', False)
+        with self.lock:
+            self.counters['requests'] += 1
+            if from_cache and not revalidated:
+                self.counters['cache_hits'] += 1
+                self.timings['cache'] += seconds
+                return
+
+            if revalidated:
+                # 304 Not Modified, the content is the cached one
+                self.counters['revalidated'] += 1
+            else:
+                if cached_session:
+                    self.counters['cache_misses'] += 1
+                self.counters['bytes'] += len(response.content)
+            self.timings['network'] += seconds
+
+    def add_parse(self, parser, seconds, objects):
+        with self.lock:
+            name = _parser_name(parser)
+            stats = self.parsers.setdefault(
+                name, {'calls': 0, 'seconds': 0., 'objects': 0}
+            )
+            stats['calls'] += 1
+            stats['seconds'] += seconds
+            stats['objects'] += objects
+
+    def parse(self, parser, func):
+        """ Time func, running parser, and count the objects it returns.
+        Iterators are timed and counted as they are consumed. """
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+        if isinstance(result, Iterator):
+            return self._iterate(parser, result, elapsed)
+        self.add_parse(parser, elapsed, count_objects(result))
+        return result
+
+    def _iterate(self, parser, iterator, elapsed):
+        objects = 0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    elapsed += time.perf_counter() - start
+                objects += count_objects(item)
+                yield item
+        finally:
+            self.add_parse(parser, elapsed, objects)
+
+    def to_dict(self):
+        with self.lock:
+            return {
+                'seconds': time.perf_counter() - self.started,
+                'requests': self.counters['requests'],
+                'cache_hits': self.counters['cache_hits'],
+                'cache_misses': self.counters['cache_misses'],
+                'revalidated': self.counters['revalidated'],
+                'bytes': self.counters['bytes'],
+                'anti_bot_pages': self.counters['anti_bot_pages'],
+                'parsed_cache_hits': self.counters['parsed_cache_hits'],
+                'timings': {name: self.timings[name]
+                            for name in ('network', 'cache', 'soup')},
+                'parsers': {name: dict(stats)
+                            for name, stats in self.parsers.items()},
+            }
+
+    def summary(self):
+        """ Human readable statistics """
+        stats = self.to_dict()
+        timings = stats['timings']
+        parse_time = sum(parser['seconds']
+                         for parser in stats['parsers'].values())
+        lines = [
+            f"{stats['seconds']:.2f}s: network {timings['network']:.2f}s, "
+            f"cache {timings['cache']:.2f}s, soup {timings['soup']:.2f}s, "
+            f"parsers {parse_time:.2f}s",
+            f"{stats['requests']} requests: {stats['cache_hits']} cache hits,"
+            f" {stats['cache_misses']} misses, {stats['revalidated']} "
+            f"revalidated, {stats['bytes'] / 2 ** 20:.2f}MB downloaded",
+            f"{stats['anti_bot_pages']} anti-bot pages, "
+            f"{stats['parsed_cache_hits']} parsed cache hits",
+        ]
+        if stats['parsers']:
+            lines.append(f"{'parser':40} {'calls':>6} {'time':>8} "
+                         f"{'objects':>8}")
+        for name, parser in sorted(stats['parsers'].items(),
+                                   key=lambda item: -item[1]['seconds']):
+            lines.append(f"{name:40} {parser['calls']:6}"
+                         f" {parser['seconds']:7.2f}s {parser['objects']:8}")
+        return '\n'.join(lines)
@@ -0,0 +1,54 @@
+# coding: utf-8
+import asyncio
+import threading
+
+import vcr
+
+from legipy.models.code import Code
+from legipy.models.law import Law
+from legipy.services.async_service import AsyncService
+
+recorder = vcr.VCR(cassette_library_dir='tests/fixtures/cassettes')
+
+
+@recorder.use_cassette('test_code_service__codes')
+def test_async_service__codes():
+    async def run():
+        async with AsyncService(max_concurrency=2) as service:
+            return await service.codes()
+
+    codes = asyncio.run(run())
+
+    assert len(codes) == 105
+    assert isinstance(codes[0], Code)
+    assert codes[0].id_code == 'LEGITEXT000006074069'
+
+
+@recorder.use_cassette('test_published_law')
+def test_async_service__get_law():
+    async def run():
+        async with AsyncService() as service:
+            return await asyncio.gather(service.get_law('JORFDOLE000024106525'))
+
+    law, = asyncio.run(run())
+
+    assert isinstance(law, Law)
+    assert law.number == '2012-410'
+
+
+def test_async_service__aclose():
+    released = threading.Event()
+
+    async def release():
+        released.set()
+
+    async def run():
+        async with AsyncService() as service:
+            # Still running on exit, until the event loop releases it
+            service.executor.submit(released.wait, 5)
+            asyncio.get_event_loop().call_later(
+                0.1, asyncio.ensure_future, release()
+            )
+
+    asyncio.run(run())
+    assert released.is_set()
@@ -0,0 +1,21 @@
+# coding: utf-8
+
+from legipy import bench
+
+
+def test_bench():
+    results = bench.run('tests/fixtures/cassettes', repeat=1,
+                        only='legislatures')
+
+    case = results['cases']['test_list_legislatures']
+    assert case['parser'] == 'parse_legislature_list'
+    assert case['objects'] == 5
+    assert case['pages_per_s'] > 0
+
+    assert bench.compare(results, results, 0.25) == []
+
+    slower = {'cases': {'test_list_legislatures': dict(
+        case, soup=case['soup'] + 2 * case['parse'] + 1
+    )}}
+    regressions = bench.compare(slower, results, 0.25)
+    assert [name for name, ratio in regressions] == ['test_list_legislatures']
@@ -0,0 +1,317 @@
+# coding: utf-8
+import datetime
+import io
+import pickle
+import sqlite3
+from collections.abc import Iterator
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+import requests
+import vcr
+from requests.adapters import BaseAdapter
+from requests.adapters import HTTPAdapter
+from requests_cache import CachedSession
+from requests_cache import EXPIRE_IMMEDIATELY, NEVER_EXPIRE
+from requests_cache.serializers import pickle_serializer
+from urllib3 import HTTPResponse
+
+from legipy.parsers import PARSER_VERSION
+from legipy.services import Service
+from legipy.services.cache import CacheManager
+from legipy.services.cache import CachePolicy
+from legipy.services.cache import CompressedSerializer
+from legipy.services.cache import CompressionStage
+from legipy.services.cache import ParsedCache
+from legipy.services.cache import compress_cache
+from legipy.services.cache import parse_size
+from legipy.services.cache import parse_ttl
+from legipy.services.code_service import CodeService
+from legipy.services.law_service import LawService
+from legipy.services.legislature_service import LegislatureService
+
+recorder = vcr.VCR(cassette_library_dir='tests/fixtures/cassettes')
+
+TODAY = datetime.date(2021, 4, 28)
+CODE_URL = 'https://www.legifrance.gouv.fr/codes/texte_lc/LEGITEXT000006074069'
+SECTION_URL = ('https://www.legifrance.gouv.fr/codes/section_lc/'
+               'LEGITEXT000006074069/LEGISCTA000018780362')
+
+
+def test_parse_ttl():
+    assert parse_ttl('never') == NEVER_EXPIRE
+    assert parse_ttl('0') == EXPIRE_IMMEDIATELY
+    assert parse_ttl('90') == 90
+    assert parse_ttl('30m') == 1800
+    assert parse_ttl('2d') == 2 * 24 * 3600
+    with pytest.raises(ValueError):
+        parse_ttl('soon')
+
+
+def test_parse_size():
+    assert parse_size('1024') == 1024
+    assert parse_size('2GB') == 2 * 2 ** 30
+    assert parse_size('1.5 kB') == 1536
+    with pytest.raises(ValueError):
+        parse_size('big')
+
+
+def test_cache_policy__page_kind():
+    kind = CachePolicy.page_kind
+    assert kind(f'{CODE_URL}/2018-02-11/', TODAY) == 'dated'
+    assert kind(f'{SECTION_URL}/2018-02-11/', TODAY) == 'dated'
+    assert kind(f'{CODE_URL}/2021-04-28/', TODAY) == 'current'
+    assert kind(f'{SECTION_URL}/2022-01-01/', TODAY) == 'current'
+    assert kind('https://www.legifrance.gouv.fr/liste/code', TODAY) == 'codes'
+    assert kind('https://www.legifrance.gouv.fr/liste/dossierslegislatifs/'
+                '15/?type=PROJET_LOI', TODAY) == 'law_lists'
+    assert kind('https://www.legifrance.gouv.fr/search', TODAY) == 'default'
+
+
+def test_cache_policy__options():
+    policy = CachePolicy.from_options(['law-lists=10m', 'current=never'])
+    assert policy.expire_after(f'{CODE_URL}/2021-04-28/', TODAY) \
+        == NEVER_EXPIRE
+    assert policy.expire_after('https://www.legifrance.gouv.fr/liste/'
+                               'dossierslegislatifs/15/', TODAY) == 600
+    assert policy.expire_after('https://www.legifrance.gouv.fr/liste/'
+                               'legislatures', TODAY) == 30 * 24 * 3600
+
+    with pytest.raises(ValueError):
+        CachePolicy.from_options(['unknown=1h'])
+    with pytest.raises(ValueError):
+        CachePolicy.from_options(['laws'])
+
+
+@recorder.use_cassette('test_list_legislatures')
+def test_cache_policy__expiration():
+    session = Service.session
+    try:
+        Service.add_cache(backend='memory')
+        service = LegislatureService()
+        service.get(service.url)
+
+        response = Service.session.get(service.url, only_if_cached=True)
+        assert response.from_cache
+        remaining = (response.expires
+                     - datetime.datetime.now(datetime.timezone.utc)).days
+        assert 28 <= remaining <= 30
+    finally:
+        Service.session = session
+        Service.parsed_cache = None
+        Service.set_adapter(None)
+
+
+@recorder.use_cassette('test_published_law', allow_playback_repeats=True)
+def test_parsed_cache(monkeypatch, tmp_path):
+    path = tmp_path / 'parsed_cache.sqlite'
+    monkeypatch.setattr(Service, 'parsed_cache', ParsedCache(path))
+    law = LawService().get_law('JORFDOLE000024106525')
+
+    def make_soup(*args, **kwargs):
+        raise AssertionError('Cached page parsed again')
+
+    monkeypatch.setattr(Service, 'make_soup', make_soup)
+    cached = LawService().get_law('JORFDOLE000024106525')
+    assert cached.to_dict() == law.to_dict()
+
+    # Another parser version discards the cached outputs
+    Service.parsed_cache = ParsedCache(path, version=PARSER_VERSION + 1)
+    with pytest.raises(AssertionError):
+        LawService().get_law('JORFDOLE000024106525')
+
+
+@recorder.use_cassette('test_code_service__codes',
+                       allow_playback_repeats=True)
+def test_parsed_cache__iterator(monkeypatch):
+    parsed_cache = ParsedCache()
+    monkeypatch.setattr(Service, 'parsed_cache', parsed_cache)
+    codes = CodeService().iter_codes()
+    # Streamed, and only stored once consumed
+    assert isinstance(codes, Iterator)
+    assert parsed_cache.stats()['entries'] == 0
+    codes = [code.to_dict() for code in codes]
+    assert parsed_cache.stats()['entries'] == 1
+
+    monkeypatch.setattr(Service, 'make_soup', None)
+    cached = CodeService().iter_codes()
+    assert isinstance(cached, Iterator)
+    assert [code.to_dict() for code in cached] == codes
+
+
+def test_parsed_cache__prune(tmp_path):
+    path = tmp_path / 'parsed_cache.sqlite'
+    # Table written by a former version, without URLs
+    db = sqlite3.connect(str(path))
+    db.execute('CREATE TABLE parsed (key TEXT PRIMARY KEY, '
+               'version INTEGER, value BLOB)')
+    db.commit()
+    db.close()
+
+    parsed_cache = ParsedCache(path, max_size=10 ** 6)
+    for number in range(4):
+        parsed_cache.set(f'key{number}', 'x' * 1000,
+                         f'{Service.domain}liste/{number}')
+    assert parsed_cache.stats()['entries'] == 4
+
+    size = parsed_cache.stats()['size']
+    assert parsed_cache.prune(size // 2) == 2
+    assert parsed_cache.get('key0') == (False, None)
+    assert parsed_cache.get('key3')[0]
+    assert parsed_cache.clear('*/liste/3') == 1
+    assert parsed_cache.stats()['entries'] == 1
+
+
+def test_compression_stage():
+    stage = CompressionStage('zlib')
+    data = pickle.dumps({'body': b'<html>' * 1000})
+    compressed = stage.dumps(data)
+    assert len(compressed) < len(data) / 10
+    assert stage.loads(compressed) == data
+    # Uncompressed pickles are loaded as is
+    assert stage.loads(data) == data
+
+
+@recorder.use_cassette('test_list_legislatures')
+def test_compress_cache(tmp_path):
+    path = tmp_path / 'requests_cache.sqlite'
+    url = 'https://www.legifrance.gouv.fr/liste/legislatures'
+    session = CachedSession(str(path), serializer=pickle_serializer)
+    content = session.get(url).content
+    session.close()
+
+    count, before, after = compress_cache(path, 'zlib', batch_size=1)
+    assert count == 1
+    assert after < before
+
+    session = CachedSession(str(path), serializer=CompressedSerializer())
+    response = session.get(url, only_if_cached=True)
+    assert response.from_cache
+    assert response.content == content
+
+
+def _fill_cache(path):
+    session = CachedSession(str(path), serializer=CompressedSerializer())
+    manager = CacheManager(path)
+    for cassette, url in [
+        ('test_list_legislatures', 'liste/legislatures'),
+        ('test_published_law', 'dossierlegislatif/JORFDOLE000024106525/'),
+        ('test_pending_law_project',
+         'dossierlegislatif/JORFDOLE000026052216/'),
+    ]:
+        with recorder.use_cassette(cassette):
+            url = f'https://www.legifrance.gouv.fr/{url}'
+            manager.record(session.get(url))
+    session.close()
+    return manager
+
+
+def test_cache_manager__stats(tmp_path):
+    manager = _fill_cache(tmp_path / 'requests_cache.sqlite')
+    manager.pinned = ['*/dossierlegislatif/*']
+    # Accesses not written yet
+    assert manager.db.execute('SELECT COUNT(*) FROM access').fetchone() \
+        == (0,)
+    stats = manager.stats()
+    assert (stats['entries'], stats['pinned'], stats['untracked']) \
+        == (3, 0, 3)
+
+    manager.flush()
+    stats = manager.stats()
+    assert (stats['entries'], stats['pinned'], stats['untracked']) \
+        == (3, 2, 0)
+    assert stats['size'] > 0
+
+
+def test_cache_manager__prune(tmp_path):
+    manager = _fill_cache(tmp_path / 'requests_cache.sqlite')
+    assert manager.stats()['entries'] == 3
+
+    manager.max_entries = 2
+    manager.pinned = ['*/liste/legislatures']
+    assert manager.prune() == 1
+    urls = sorted(url for url, in manager.db.execute('SELECT url FROM access'))
+    assert urls == [
+        'https://www.legifrance.gouv.fr/dossierlegislatif/'
+        'JORFDOLE000026052216/',
+        'https://www.legifrance.gouv.fr/liste/legislatures',
+    ]
+
+    before, after = manager.vacuum()
+    assert after <= before
+
+
+def test_cache_manager__concurrent_touch(tmp_path, monkeypatch):
+    manager = CacheManager(tmp_path / 'requests_cache.sqlite', max_entries=1,
+                           check_every=10, flush_every=1000)
+    prunes = []
+    monkeypatch.setattr(manager, 'prune', lambda: prunes.append(1))
+
+    def touch(worker):
+        for number in range(100):
+            manager.touch(f'{worker}-{number}', None, stored=True)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(touch, range(8)))
+    assert len(prunes) == 80
+    assert manager.stored == 0
+    assert len(manager.pending) == 800
+
+
+def test_cache_manager__clear(tmp_path):
+    manager = _fill_cache(tmp_path / 'requests_cache.sqlite')
+    assert manager.clear('*/dossierlegislatif/*') == 2
+    assert manager.stats()['entries'] == 1
+    assert manager.clear() == 1
+
+
+class RevalidatingAdapter(BaseAdapter):
+    """ Serves a page with an ETag, and 304 to requests revalidating it """
+    def __init__(self, content):
+        super().__init__()
+        self.content = content
+        self.requests = []
+
+    def send(self, request, **kwargs):
+        self.requests.append(request)
+        if request.headers.get('If-None-Match') == '"v1"':
+            status, content = 304, b''
+        else:
+            status, content = 200, self.content
+        raw = HTTPResponse(body=io.BytesIO(content), headers={'ETag': '"v1"'},
+                           status=status, preload_content=False,
+                           request_url=request.url)
+        return HTTPAdapter().build_response(request, raw)
+
+    def close(self):
+        pass
+
+
+def test_conditional_revalidation(monkeypatch):
+    with recorder.use_cassette('test_list_legislatures'):
+        adapter = RevalidatingAdapter(
+            requests.get(LegislatureService.url).content
+        )
+    session = Service.session
+    monkeypatch.setattr(Service, 'cache_policy',
+                        CachePolicy(legislatures='0'))
+    try:
+        Service.add_cache(backend='memory')
+        Service.set_adapter(adapter)
+        service = LegislatureService()
+        # Singleton whose legislatures other tests may have fetched
+        service.cache = None
+        legislatures = [leg.to_dict() for leg in service.legislatures()]
+        service.cache = None
+
+        # The body of the 304 is the cached one, whose parse is cached too
+        monkeypatch.setattr(Service, 'make_soup', None)
+        assert [leg.to_dict() for leg in service.legislatures()] \
+            == legislatures
+        assert len(adapter.requests) == 2
+        assert adapter.requests[1].headers['If-None-Match'] == '"v1"'
+    finally:
+        LegislatureService().cache = None
+        Service.session = session
+        Service.parsed_cache = None
+        Service.set_adapter(None)
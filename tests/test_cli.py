@@ -0,0 +1,52 @@
+# coding: utf-8
+import json
+import sys
+
+import vcr
+from click.testing import CliRunner
+
+from legipy.cli import _command_hook
+from legipy.cli import cli
+
+recorder = vcr.VCR(cassette_library_dir='tests/fixtures/cassettes')
+
+
+@recorder.use_cassette('test_code_service__codes')
+def test_cli__codes_ndjson():
+    result = CliRunner().invoke(cli, ['--no-cache', '--no-webdriver',
+                                      '--format', 'ndjson', 'codes'])
+
+    assert result.exit_code == 0
+    lines = result.output.splitlines()
+    assert len(lines) == 105
+    assert json.loads(lines[0]) == {
+        'id_code': 'LEGITEXT000006074069',
+        'title': "Code de l'action sociale et des familles",
+        'url_code': ('https://www.legifrance.gouv.fr/codes/texte_lc'
+                     '/LEGITEXT000006074069'),
+    }
+
+
+@recorder.use_cassette('test_code_service__codes',
+                       allow_playback_repeats=True)
+def test_cli__utf8():
+    options = ['--no-cache', '--no-webdriver', '--format', 'ndjson']
+    escaped = CliRunner().invoke(cli, [*options, 'codes']).output
+    assert escaped.isascii()
+    assert '\\u00e9' in escaped
+
+    utf8 = CliRunner().invoke(cli, [*options, '--utf8', 'codes']).output
+    assert 'é' in utf8
+    assert [json.loads(line) for line in utf8.splitlines()] == \
+        [json.loads(line) for line in escaped.splitlines()]
+
+
+def test_cli__on_captcha(tmp_path):
+    path = tmp_path / 'notified'
+    hook = _command_hook(
+        f'{sys.executable} -c "import sys; '
+        f'open({str(path)!r}, \'w\').write(\' \'.join(sys.argv[1:]))"'
+    )
+    hook('https://example.org/', 'Request unsuccessful.')
+    # The command exited before the hook returned
+    assert path.read_text() == 'https://example.org/ Request unsuccessful.'
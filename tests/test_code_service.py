@@ -1,10 +1,13 @@
 # coding: utf-8
 import datetime
+import sys
 
 import vcr
+from bs4 import BeautifulSoup
 
 from legipy.models.code import Article
 from legipy.models.code import Code
+from legipy.parsers.code_parser import CodeParser
 from legipy.services.code_service import CodeService
 from legipy.services.code_service import SectionService
 
@@ -88,3 +91,46 @@ def test_section_service__articles():
     assert isinstance(article, Article)
     assert article.title == "Annexe 1-1"
     assert article.history == ("Modifié par Ordonnance n°2016-301 du 14 mars 2016 - art. 2 (V)")
+
+
+@recorder.use_cassette('test_code_service__code')
+def test_code_service__code_fetch_sections(monkeypatch):
+    fetched = []
+
+    def articles(self, id_code, id_section, date_pub):
+        fetched.append(id_section)
+        return [Article(f'{id_section} article', 'Modifié', id_section)]
+
+    monkeypatch.setattr(SectionService, 'articles', articles)
+
+    service = CodeService()
+    id_code = 'LEGITEXT000006074069'
+    code = service.code(id_code, date_pub='2018-02-11', with_articles=True,
+                        fetch_sections=True, workers=4)
+
+    assert len(fetched) == len(set(fetched)) == 885
+    annexe = code.children[2]
+    assert annexe.id_section == 'LEGISCTA000018780362'
+    assert len(annexe.articles) == 1
+    assert annexe.articles[0].history == 'Modifié'
+
+
+def test_code_parser__deep_toc():
+    depth = sys.getrecursionlimit() + 500
+    html = ('<ul id="liste-sommaire">' + ''.join(
+        f'<li><span class="title-link" id="S{i}">Section {i}</span><ul>'
+        for i in range(depth)
+    ) + '<li><a class="articleLink" id="artA1">Article 1</a></li>'
+        + '</ul></li>' * depth + '</ul>')
+    toc = BeautifulSoup(html, 'html.parser').find('ul', id='liste-sommaire')
+
+    parser = CodeParser('LEGITEXT', '2018-02-11', with_articles=True)
+    section, = parser.parse_toc('https://www.legifrance.gouv.fr/',
+                                toc.find_all('li', recursive=False))
+
+    for i in range(depth - 1):
+        assert section.id_section == f'S{i}'
+        assert section.articles is None
+        section, = section.children
+    assert section.children is None
+    assert [article.id_article for article in section.articles] == ['A1']
@@ -0,0 +1,84 @@
+# coding: utf-8
+import json
+
+import pytest
+import vcr
+
+from legipy import serialize
+from legipy.crawl import Crawler
+from legipy.models.code import Article
+from legipy.models.code import Code
+from legipy.services.code_service import CodeService
+from legipy.services.code_service import SectionService
+
+recorder = vcr.VCR(cassette_library_dir='tests/fixtures/cassettes')
+
+ID_CODE = 'LEGITEXT000006074069'
+
+
+@recorder.use_cassette('test_code_service__code', allow_playback_repeats=True)
+def test_crawl__resume(monkeypatch, tmp_path):
+    fetched, interrupted, tocs = [], [], []
+    code = CodeService.code
+
+    def codes(self):
+        return [Code(ID_CODE, "Code de l'action sociale et des familles")]
+
+    def articles(self, id_code, id_section, date_pub):
+        if len(fetched) == 100 and not interrupted:
+            interrupted.append(id_section)
+            raise KeyboardInterrupt
+        fetched.append(id_section)
+        return [Article(f'{id_section} article', 'Modifié', id_section)]
+
+    def counted_code(self, *args, **kwargs):
+        tocs.append(args[0])
+        return code(self, *args, **kwargs)
+
+    monkeypatch.setattr(CodeService, 'codes', codes)
+    monkeypatch.setattr(CodeService, 'code', counted_code)
+    monkeypatch.setattr(SectionService, 'articles', articles)
+
+    crawler = Crawler(tmp_path, '2018-02-11', workers=1)
+    with pytest.raises(KeyboardInterrupt):
+        crawler.run()
+    assert not (tmp_path / 'codes' / f'{ID_CODE}.json').exists()
+    assert (tmp_path / 'codes' / f'{ID_CODE}.toc.json').exists()
+
+    # Resumed at the date of the interrupted crawl, without fetching again
+    # the TOC or the sections
+    Crawler(tmp_path, workers=4).run()
+    assert len(fetched) == len(set(fetched)) == 885
+    assert tocs == [ID_CODE]
+
+    with open(tmp_path / 'codes' / f'{ID_CODE}.json') as f:
+        code = json.load(f)
+    assert code['date_pub'] == '2018-02-11'
+    assert code['children'][2]['articles'] == [{
+        'history': 'Modifié',
+        'id_article': 'LEGISCTA000018780362',
+        'title': 'LEGISCTA000018780362 article',
+    }]
+    with open(tmp_path / 'checkpoint') as f:
+        assert f.read().split('\n') == ['codes', f'toc {ID_CODE}',
+                                        f'code {ID_CODE}', '']
+    assert not (tmp_path / 'codes' / f'{ID_CODE}.sections.ndjson').exists()
+    assert not (tmp_path / 'codes' / f'{ID_CODE}.toc.json').exists()
+
+    # Completed codes are skipped
+    fetched.clear()
+    Crawler(tmp_path).run()
+    assert fetched == []
+
+
+@recorder.use_cassette('test_code_service__code')
+def test_crawl__load_code():
+    code = CodeService().code(ID_CODE, '2018-02-11', with_articles=True)
+    data = json.loads(serialize.dumps(code))
+    assert json.loads(serialize.dumps(Crawler.load_code(data))) == data
+
+
+def test_crawl__other_date(tmp_path):
+    Crawler(tmp_path, '2018-02-11')
+    with pytest.raises(ValueError):
+        Crawler(tmp_path, '2021-04-28')
@@ -0,0 +1,71 @@
+# coding: utf-8
+import copy
+
+import vcr
+
+from legipy.diff import diff_codes
+from legipy.models.code import Article
+from legipy.models.code import Code
+from legipy.models.code import Section
+from legipy.services.code_service import CodeService
+from legipy.services.code_service import SectionService
+
+recorder = vcr.VCR(cassette_library_dir='tests/fixtures/cassettes')
+
+
+@recorder.use_cassette('test_code_service__code')
+def test_code_diff(monkeypatch):
+    old = CodeService().code('LEGITEXT000006074069', '2018-02-11',
+                             with_articles=True)
+    assert diff_codes(old, old)['modified_sections'] == []
+    assert 'children' not in diff_codes(old, old)
+
+    new = copy.deepcopy(old)
+    first, second, annexe = new.children[:3]
+    first.title = 'Partie législative (nouvelle)'
+    removed = second.children.pop()
+    section = annexe
+    while section.children:
+        section = section.children[0]
+    section.articles.append(Article('Annexe 1-2', None, 'LEGIARTI0000TEST'))
+
+    codes = {'2018-02-11': old, '2021-04-28': new}
+    fetched = []
+
+    def code(self, id_code, date_pub, with_articles):
+        return codes[date_pub]
+
+    def articles(self, id_code, id_section, date_pub):
+        fetched.append((id_section, date_pub))
+        return [Article('Annexe 1-2', 'Créé par Loi', 'LEGIARTI0000TEST')]
+
+    monkeypatch.setattr(CodeService, 'code', code)
+    monkeypatch.setattr(SectionService, 'articles', articles)
+
+    diff = CodeService().code_diff('LEGITEXT000006074069', '2018-02-11',
+                                   '2021-04-28')
+
+    assert fetched == [(section.id_section, '2021-04-28')]
+    assert diff['added_sections'] == []
+    assert diff['removed_sections'][0]['id_section'] == removed.id_section
+    modified = {s['id_section']: s for s in diff['modified_sections']}
+    assert set(modified) == {first.id_section, second.id_section,
+                             section.id_section}
+    assert modified[first.id_section]['old_title'] == 'Partie législative'
+    assert modified[second.id_section]['children'] \
+        == [child.id_section for child in second.children]
+    added, = modified[section.id_section]['added_articles']
+    assert added.history == 'Créé par Loi'
+    assert 'children' not in diff
+
+
+def test_code_diff__reordered():
+    old = Code('LEGITEXT000006074069', date_pub='2018-02-11')
+    old.children = [Section('LEGISCTA1', 'Titre I'),
+                    Section('LEGISCTA2', 'Titre II')]
+    new = copy.deepcopy(old)
+    new.children.reverse()
+
+    diff = diff_codes(old, new)
+    assert diff['modified_sections'] == []
+    assert diff['children'] == ['LEGISCTA2', 'LEGISCTA1']
@@ -0,0 +1,96 @@
+# coding: utf-8
+import vcr
+
+from legipy.index import SearchIndex
+from legipy.index import fill_index
+from legipy.models.code import Article
+from legipy.models.code import Code
+from legipy.models.code import Section
+from legipy.services import Service
+from legipy.services.code_service import CodeService
+from legipy.services.code_service import SectionService
+
+recorder = vcr.VCR(cassette_library_dir='tests/fixtures/cassettes')
+
+ID_CODE = 'LEGITEXT000006074069'
+DATE = '2018-02-11'
+
+
+@recorder.use_cassette('test_code_service__code',
+                       allow_playback_repeats=True)
+def test_index__fill_and_search(monkeypatch, tmp_path):
+    code = CodeService().code(ID_CODE, DATE, with_articles=True)
+    toc = {section.id_section: section.articles for section in code.sections()}
+    fetched = []
+
+    def articles(self, id_code, id_section, date_pub):
+        fetched.append(id_section)
+        articles = [Article(article.title,
+                            'Modifié par Ordonnance n°2016-301',
+                            article.id_article)
+                    for article in toc[id_section]]
+        self.index.index_section(id_code, date_pub, id_section, articles)
+        return articles
+
+    monkeypatch.setattr(SectionService, 'articles', articles)
+
+    index = SearchIndex(tmp_path / 'index.sqlite')
+    assert fill_index(index, ID_CODE, DATE) == 885
+    assert len(fetched) == 885
+    assert index.missing_sections(ID_CODE, DATE) == []
+
+    # Nothing is missing any more
+    assert fill_index(index, ID_CODE, DATE) == 0
+    assert len(fetched) == 885
+
+    results = index.search('ordonnance 2016-301', ID_CODE, DATE, limit=3)
+    assert len(results) == 3
+    assert results[0]['id_code'] == ID_CODE
+    assert results[0]['date_pub'] == DATE
+    assert results[0]['history'] == 'Modifié par Ordonnance n°2016-301'
+
+    assert index.search('ordonnance', date_pub='2021-04-28') == []
+
+
+@recorder.use_cassette('test_code_service__code')
+def test_index__code_titles(tmp_path):
+    index = SearchIndex(tmp_path / 'index.sqlite')
+    code = CodeService().code(ID_CODE, DATE, with_articles=True)
+    index.index_code(code, DATE)
+
+    # Accents are ignored
+    results = index.search('Etablissements', ID_CODE, DATE, limit=1000)
+    assert results
+    assert all('tablissement' in result['section_title'].lower()
+               or 'tablissement' in result['title'].lower()
+               for result in results)
+    assert index.missing_sections(ID_CODE, DATE)
+
+
+def test_index__section_page(monkeypatch, tmp_path):
+    code = Code(ID_CODE, 'Code de test')
+    child = Section('LEGISCTA2', 'Sous-section',
+                    articles=[Article('Article 2', None, 'LEGIARTI2')],
+                    url_section='section_lc/LEGISCTA2')
+    code.children = [Section('LEGISCTA1', 'Section',
+                             articles=[Article('Article 1', None, 'LEGIARTI1')],
+                             url_section='section_lc/LEGISCTA1',
+                             children=[child])]
+    index = SearchIndex(tmp_path / 'index.sqlite')
+    index.index_code(code, DATE)
+
+    # The page of a section also lists the articles of its sub-sections
+    page = [Article('Article 1', 'Créé par Loi', 'LEGIARTI1'),
+            Article('Article 2', 'Créé par Loi', 'LEGIARTI2')]
+    monkeypatch.setattr(SectionService, 'get', lambda self, *args, **kwargs:
+                        (args[0], None))
+    monkeypatch.setattr(SectionService, 'parse', lambda self, *args: page)
+    monkeypatch.setattr(Service, 'index', index)
+    SectionService().articles(ID_CODE, 'LEGISCTA1', DATE)
+    SectionService().articles(ID_CODE, 'LEGISCTA2', DATE)
+
+    results = index.search('loi', ID_CODE, DATE)
+    assert sorted((result['id_section'], result['id_article'])
+                  for result in results) == [('LEGISCTA1', 'LEGIARTI1'),
+                                             ('LEGISCTA2', 'LEGIARTI2')]
+    assert index.missing_sections(ID_CODE, DATE) == []
@@ -0,0 +1,54 @@
+# coding: utf-8
+import pytest
+from bs4.builder import builder_registry
+
+from legipy import bench
+from legipy import serialize
+from legipy.parsers.code_parser import CodeParser
+from legipy.parsers.pending_law_list_parser import iter_pending_law_list
+from legipy.parsers.pending_law_list_parser import parse_pending_law_list
+from legipy.parsers.published_law_list_parser import iter_published_law_list
+from legipy.parsers.published_law_list_parser import parse_published_law_list
+from legipy.services import make_soup
+
+# Iterating parsers used by the services, and their list versions
+ITER_PARSERS = {
+    CodeParser.parse_code_list: CodeParser.iter_code_list,
+    parse_pending_law_list: iter_pending_law_list,
+    parse_published_law_list: iter_published_law_list,
+}
+
+PAGES = [(name, url, content)
+         for name, url, content in bench.load_pages('tests/fixtures/cassettes')
+         if bench.find_parser(url)[0] is not None]
+
+
+def _parse(parser, url, soup, args):
+    result = parser(url, soup, *args)
+    if parser in ITER_PARSERS.values():
+        result = list(result)
+    return serialize.dumps(result)
+
+
+@pytest.mark.parametrize('features', [
+    pytest.param('lxml', marks=pytest.mark.skipif(
+        builder_registry.lookup('lxml') is None, reason='lxml not installed'
+    )),
+    'html.parser',
+])
+@pytest.mark.parametrize('name, url, content', PAGES,
+                         ids=[page[0] for page in PAGES])
+def test_parse_only(name, url, content, features):
+    """ Parsers give the same output on the strained soup as on the full
+    page """
+    parser, args = bench.find_parser(url)
+    parsers = [parser]
+    if parser in ITER_PARSERS:
+        parsers.append(ITER_PARSERS[parser])
+
+    for parser in parsers:
+        assert parser.parse_only is not None
+        strained = make_soup(content, features, parser.parse_only)
+        full = make_soup(content, features)
+        assert _parse(parser, url, strained, args) == \
+            _parse(parser, url, full, args)
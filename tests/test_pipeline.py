@@ -0,0 +1,43 @@
+# coding: utf-8
+import vcr
+
+from legipy.parsers.code_parser import CodeParser
+from legipy.services import Service
+from legipy.services.code_service import CodeService
+from legipy.services.pipeline import ParsePool
+
+recorder = vcr.VCR(cassette_library_dir='tests/fixtures/cassettes')
+
+
+@recorder.use_cassette('test_code_service__code', allow_playback_repeats=True)
+def test_parse_pool__code(monkeypatch):
+    code = CodeService().code('LEGITEXT000006074069', '2018-02-11',
+                              with_articles=True)
+
+    with ParsePool(2) as pool:
+        monkeypatch.setattr(Service, 'parse_pool', pool)
+        # Soups are only built in the pool’s processes
+        monkeypatch.setattr(Service, 'make_soup', None)
+        pooled = CodeService().code('LEGITEXT000006074069', '2018-02-11',
+                                    with_articles=True)
+
+    assert pooled.to_dict() == code.to_dict()
+
+
+@recorder.use_cassette('test_code_service__codes')
+def test_parse_pool__iterator(monkeypatch):
+    with ParsePool(1) as pool:
+        monkeypatch.setattr(Service, 'parse_pool', pool)
+        codes = CodeService().iter_codes()
+
+    assert isinstance(codes, list)
+    assert len(codes) == 105
+    assert codes[0].id_code == 'LEGITEXT000006074069'
+
+
+def test_parse_pool__classmethod():
+    with ParsePool(1) as pool:
+        assert pool.parse(CodeParser.parse_code_list, 'html.parser',
+                          'https://www.legifrance.gouv.fr/liste/code',
+                          b'<h2><a id="idLEGITEXT1" href="/c">Code</a></h2>'
+                          )[0].id_code == 'LEGITEXT1'
@@ -0,0 +1,106 @@
+# coding: utf-8
+import io
+
+import pytest
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+from legipy.services import Service
+from legipy.services.retry import CaptchaError
+from legipy.services.retry import RetryBackoff
+
+from .test_service import ANTI_BOT_CONTENT
+
+
+class BlockingAdapter(HTTPAdapter):
+    """ Answers the anti-bot page to the first `blocks` requests """
+    def __init__(self, blocks, anti_bot=ANTI_BOT_CONTENT):
+        super(BlockingAdapter, self).__init__()
+        self.blocks = blocks
+        self.anti_bot = anti_bot
+        self.sent = 0
+
+    def send(self, request, **kwargs):
+        self.sent += 1
+        content = self.anti_bot if self.sent <= self.blocks \
+            else b'<html><body><h1>Code</h1><p>Text</p></body></html>'
+        return self.build_response(request, HTTPResponse(
+            io.BytesIO(content), status=200, preload_content=False
+        ))
+
+
+@pytest.fixture
+def blocked_service(monkeypatch):
+    def service(blocks, retry_backoff, anti_bot=ANTI_BOT_CONTENT):
+        adapter = BlockingAdapter(blocks, anti_bot)
+        session = requests.Session()
+        session.mount(Service.domain, adapter)
+        monkeypatch.setattr(Service, 'session', session)
+        monkeypatch.setattr(Service, 'throttle', None)
+        monkeypatch.setattr(Service, 'retry_backoff', retry_backoff)
+        return Service(), adapter
+    return service
+
+
+def test_retry_backoff__backoff():
+    retry_backoff = RetryBackoff(delay=10., factor=2., max_delay=60.)
+    assert [retry_backoff.backoff(blocks) for blocks in range(1, 6)] == \
+        [10., 20., 40., 60., 60.]
+
+
+def test_retry_backoff__resolved(blocked_service):
+    notified = []
+    retry_backoff = RetryBackoff(delay=0., on_captcha=lambda *args:
+                                 notified.append(args))
+    service, adapter = blocked_service(2, retry_backoff)
+
+    url = f'{Service.domain}codes/id/LEGITEXT000006074069'
+    assert service.get(url)[1].content.startswith(b'<html><body><h1>')
+    assert adapter.sent == 3
+    # Notified once, on the first block
+    assert notified == [(url, 'Request unsuccessful: '
+                              '"Incapsula incident ID: 1234-5678"')]
+    assert retry_backoff.blocked == {}
+    assert retry_backoff.unresolved == {}
+
+
+def test_retry_backoff__text_only(blocked_service):
+    retry_backoff = RetryBackoff(delay=0.)
+    service, adapter = blocked_service(
+        1, retry_backoff,
+        b'<html><body>Request unsuccessful.</body></html>'
+    )
+
+    url = f'{Service.domain}codes/id/LEGITEXT000006074069'
+    assert service.get(url)[1].content.startswith(b'<html><body><h1>')
+    assert adapter.sent == 2
+
+
+def test_retry_backoff__unresolved(blocked_service):
+    retry_backoff = RetryBackoff(delay=0., tries=2)
+    service, adapter = blocked_service(10, retry_backoff)
+
+    url = f'{Service.domain}codes/id/LEGITEXT000006074069'
+    with pytest.raises(CaptchaError) as error:
+        service.get(url)
+    assert error.value.url == url
+    assert adapter.sent == 3
+    assert list(retry_backoff.unresolved) == [url]
+
+    output = io.StringIO()
+    assert retry_backoff.report(output) == 1
+    assert url in output.getvalue()
+
+
+def test_retry_backoff__out_of_retries(blocked_service, monkeypatch):
+    monkeypatch.setattr(Service, 'retries', 3)
+    retry_backoff = RetryBackoff(delay=0., tries=10)
+    service, adapter = blocked_service(10, retry_backoff)
+
+    url = f'{Service.domain}codes/id/LEGITEXT000006074069'
+    with pytest.raises(CaptchaError):
+        service.get(url)
+    assert adapter.sent == 3
+    assert list(retry_backoff.unresolved) == [url]
+    assert retry_backoff.blocked == {}
@@ -0,0 +1,158 @@
+# coding: utf-8
+import io
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from urllib3 import HTTPResponse
+
+from legipy.services import Service
+from legipy.services.selenium import Browser
+from legipy.services.selenium import HybridAdapter
+from legipy.services.selenium import WebdriverAdapter
+
+from .test_service import ANTI_BOT_CONTENT
+
+
+class FakeDriver(object):
+    def __init__(self, name, barrier=None):
+        self.name = name
+        self.barrier = barrier
+        self.current_url = None
+        self.loaded = []
+
+    def get(self, url):
+        self.loaded.append(url)
+        if self.barrier is not None:
+            # Returns only once all the drivers load a page at once
+            self.barrier.wait(timeout=5)
+        self.current_url = url
+
+    def get_cookies(self):
+        return [{'name': 'clearance', 'value': 'ok', 'path': '/',
+                 'domain': 'www.legifrance.gouv.fr', 'secure': True}]
+
+    def execute_script(self, script):
+        return 'Browser/1.0'
+
+    @property
+    def page_source(self):
+        return f'<html><body><h1>{self.name}</h1><p>Text</p></body></html>'
+
+
+class FakeBrowser(object):
+    def __init__(self, driver):
+        self.driver = driver
+
+
+def _session(number):
+    return {'url': f'http://127.0.0.1:{number}', 'session_id': str(number),
+            'capabilities': {}, 'w3c': True}
+
+
+def test_saved_sessions(tmp_path, monkeypatch):
+    monkeypatch.setattr(Browser, 'path', tmp_path / 'selenium.json')
+    assert Browser.saved_sessions() == []
+
+    Browser.path.write_text(json.dumps(
+        {'pid': 1, 'sessions': [_session(1), _session(2)]}
+    ))
+    assert Browser.saved_sessions() == [_session(1), _session(2)]
+
+    # Single session saved by former versions
+    Browser.path.write_text(json.dumps(dict(_session(1), pid=1)))
+    assert Browser.saved_sessions() == [dict(_session(1), pid=1)]
+
+
+def _adapter(monkeypatch, drivers):
+    monkeypatch.setattr(Browser, 'pool', classmethod(
+        lambda cls, workers=None, driver_name='firefox':
+        [FakeBrowser(driver) for driver in drivers]
+    ))
+    session = requests.Session()
+    session.mount('https://', WebdriverAdapter(workers=len(drivers)))
+    return session
+
+
+def test_webdriver_adapter__pool(monkeypatch):
+    barrier = threading.Barrier(3)
+    drivers = [FakeDriver(f'browser {i}', barrier) for i in range(3)]
+    session = _adapter(monkeypatch, drivers)
+
+    urls = [f'https://example.org/{i}' for i in range(3)]
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        responses = list(executor.map(session.get, urls))
+
+    assert [response.url for response in responses] == urls
+    assert sorted(response.text for response in responses) == [
+        f'<html><body><h1>browser {i}</h1><p>Text</p></body></html>'
+        for i in range(3)
+    ]
+
+
+def test_webdriver_adapter__raw(monkeypatch):
+    session = _adapter(monkeypatch, [FakeDriver('browser')])
+    response = session.get('https://example.org/')
+
+    assert response.status_code is None
+    assert response.content == \
+        b'<html><body><h1>browser</h1><p>Text</p></body></html>'
+    # Expected by requests_cache to cache the response
+    assert response.raw._request_url == 'https://example.org/'
+
+
+class FakeHybridAdapter(HybridAdapter):
+    """ Answers the anti-bot page to requests without the browser’s cookie
+    """
+    def send(self, request, **kwargs):
+        if 'clearance=ok' in request.headers.get('Cookie', ''):
+            content = b'<html><body><h1>Code</h1><p>Text</p></body></html>'
+        else:
+            content = ANTI_BOT_CONTENT
+        return self.build_response(request, HTTPResponse(
+            io.BytesIO(content), status=200, preload_content=False
+        ))
+
+
+def test_hybrid_adapter(monkeypatch):
+    driver = FakeDriver('browser')
+    _adapter(monkeypatch, [driver])
+    adapter = FakeHybridAdapter()
+    session = requests.Session()
+    monkeypatch.setattr(Service, 'session', session)
+    monkeypatch.setattr(Service, 'throttle', None)
+    Service.set_adapter(adapter)
+    try:
+        url = f'{Service.domain}codes/id/LEGITEXT000006074069'
+        for _ in range(2):
+            assert Service().get(url)[1].content.startswith(
+                b'<html><body><h1>Code</h1>'
+            )
+    finally:
+        Service.set_adapter(None)
+
+    # Only the first request went through the browser
+    assert driver.loaded == [url]
+    assert session.cookies.get('clearance') == 'ok'
+    assert session.headers['User-Agent'] == 'Browser/1.0'
+
+    # Requests blocked before then do not go through it again
+    assert adapter.clear_anti_bot(session, url, since=0.)
+    assert driver.loaded == [url]
+
+
+def test_hybrid_adapter__pool_settings(monkeypatch):
+    monkeypatch.setattr(Service, 'session', requests.Session())
+    monkeypatch.setattr(Service, 'pool', Service.pool)
+    adapter = HybridAdapter()
+    Service.set_adapter(adapter)
+    try:
+        # Configured once mounted
+        Service.configure_pool(pool_maxsize=32, pool_block=True)
+        assert Service.session.get_adapter(Service.domain) is adapter
+        assert adapter._pool_maxsize == 32
+        assert adapter._pool_block is True
+        assert adapter.poolmanager.connection_pool_kw['maxsize'] == 32
+    finally:
+        Service.set_adapter(None)
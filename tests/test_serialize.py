@@ -0,0 +1,69 @@
+# coding: utf-8
+import datetime
+import io
+import json
+
+import pytest
+import vcr
+
+from legipy import serialize
+from legipy.services.code_service import CodeService
+from legipy.services.law_service import LawService
+
+recorder = vcr.VCR(cassette_library_dir='tests/fixtures/cassettes')
+
+
+@recorder.use_cassette('test_code_service__code')
+def test_dump_code():
+    service = CodeService()
+    code = service.code('LEGITEXT000006074069', date_pub='2018-02-11',
+                        with_articles=True)
+
+    for compact in (False, True):
+        stream = io.StringIO()
+        serialize.dump(code, stream, compact=compact)
+        assert stream.getvalue() == serialize.dumps(code, compact=compact)
+
+
+def test_iterencode():
+    values = [[], {}, [1, [], {'b': None}], {'a': 'x\ny'},
+              datetime.date(2018, 2, 11)]
+    for compact in (False, True):
+        for value in values:
+            assert (''.join(serialize.iterencode(value, compact))
+                    == serialize.dumps(value, compact))
+
+        assert (''.join(serialize.iterencode(iter(values), compact))
+                == serialize.dumps(values, compact))
+
+
+@pytest.mark.skipif(serialize.orjson is None, reason='orjson not installed')
+@recorder.use_cassette('test_list_published_laws')
+def test_backends(monkeypatch):
+    laws = LawService().published_laws(13)
+
+    for compact in (False, True):
+        monkeypatch.setattr(serialize, 'backend', 'json')
+        expected = serialize.dumps(laws, compact=compact)
+        monkeypatch.setattr(serialize, 'backend', 'orjson')
+        assert serialize.dumps(laws, compact=compact) == expected
+
+
+@pytest.mark.parametrize('backend', [
+    'json',
+    pytest.param('orjson', marks=pytest.mark.skipif(
+        serialize.orjson is None, reason='orjson not installed'
+    )),
+])
+def test_ensure_ascii(backend, monkeypatch):
+    monkeypatch.setattr(serialize, 'backend', backend)
+    value = {'title': 'Code général – \U0001d11e'}
+    for compact in (False, True):
+        assert json.loads(serialize.dumps(value, compact)) == value
+        # Escaped as by the json module, by default
+        assert serialize.dumps(value, compact).isascii()
+        assert '\\u00e9' in serialize.dumps(value, compact)
+        assert '\\ud834\\udd1e' in serialize.dumps(value, compact)
+        assert 'é' in serialize.dumps(value, compact, ensure_ascii=False)
+        assert ''.join(serialize.iterencode([value], compact)) == \
+            serialize.dumps([value], compact)
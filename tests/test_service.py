@@ -0,0 +1,138 @@
+# coding: utf-8
+import io
+
+import pytest
+import requests
+import vcr
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+
+from legipy.services import ANTI_BOT_PAGE
+from legipy.services import Service
+from legipy.services import anti_bot_message
+from legipy.services import make_soup
+from legipy.services.code_service import CodeService
+from legipy.services.legislature_service import LegislatureService
+from legipy.services.throttle import RateLimiter
+
+recorder = vcr.VCR(cassette_library_dir='tests/fixtures/cassettes')
+
+ANTI_BOT_CONTENT = (
+    b'<html style="height:100%"><head><META NAME="ROBOTS" '
+    b'CONTENT="NOINDEX, NOFOLLOW"></head><body style="margin:0px;height:100%">'
+    b'<iframe id="main-iframe" src="/_Incapsula_Resource?CWUDNSAI=9" '
+    b'frameborder=0 width="100%" height="100%">Request unsuccessful. '
+    b'Incapsula incident ID: 1234-5678</iframe></body></html>'
+)
+
+
+def test_anti_bot_page():
+    match = ANTI_BOT_PAGE.search(ANTI_BOT_CONTENT)
+    assert match is not None
+    assert match.group(2) == (b'Request unsuccessful. '
+                              b'Incapsula incident ID: 1234-5678')
+
+    assert ANTI_BOT_PAGE.search(b'<html><body></body></html>') is not None
+    assert ANTI_BOT_PAGE.search(
+        b'<html><body><h1>Title</h1><p>Text</p></body></html>'
+    ) is None
+
+
+def test_anti_bot_message():
+    assert anti_bot_message(ANTI_BOT_CONTENT) == (
+        'Request unsuccessful. Incapsula incident ID: 1234-5678'
+    )
+    assert anti_bot_message(b'<html><body></body></html>') == ''
+    assert anti_bot_message(
+        b'<html><body><h1>Title</h1><p>Text</p></body></html>'
+    ) is None
+
+    # Text-only body, and body left open, checked on the parsed body
+    assert anti_bot_message(
+        b'<html><body>Request unsuccessful. Incapsula incident ID: 1234'
+        b'</body></html>'
+    ) == 'Request unsuccessful. Incapsula incident ID: 1234'
+    assert anti_bot_message(
+        b'<html><body><iframe src="/_Incapsula_Resource">Request '
+        b'unsuccessful.</iframe>'
+    ) == 'Request unsuccessful.'
+    assert anti_bot_message(
+        b'<html><body><h1>Title</h1><p>Text</p>'
+    ) is None
+
+
+@recorder.use_cassette('test_list_legislatures')
+def test_lazy_soup():
+    service = LegislatureService()
+    url, soup = service.get(service.url)
+
+    assert soup._soup is None
+    assert ANTI_BOT_PAGE.search(soup.content) is None
+
+    assert len(soup.find_all('h2')) > 0
+    assert soup._soup is not None
+
+
+def test_service__pool_settings():
+    session, pool, timeout = Service.session, Service.pool, Service.timeout
+    try:
+        Service.configure_pool(pool_maxsize=32, pool_block=True, timeout=30)
+        Service.add_cache(backend='memory')
+        adapter = Service.session.get_adapter(Service.domain)
+        assert adapter._pool_maxsize == 32
+        assert adapter._pool_block is True
+
+        Service.set_adapter(None)
+        adapter = Service.session.get_adapter(Service.domain)
+        assert adapter._pool_maxsize == 32
+        assert Service.timeout == 30
+    finally:
+        Service.session, Service.pool = session, pool
+        Service.timeout, Service.parsed_cache = timeout, None
+        Service.set_adapter(None)
+
+
+@recorder.use_cassette('test_code_service__codes')
+def test_service__pool_stats():
+    CodeService().codes()
+    stats = Service.pool_stats()
+    assert stats['https://www.legifrance.gouv.fr']['requests'] >= 1
+
+
+class NoStatusAdapter(HTTPAdapter):
+    """ Answers like WebdriverAdapter, without an HTTP status """
+    def send(self, request, **kwargs):
+        response = self.build_response(request, HTTPResponse(
+            io.BytesIO(b'<html><body><h1>Code</h1><p>Text</p></body></html>'),
+            preload_content=False
+        ))
+        response.status_code = None
+        return response
+
+
+def test_service__no_status(monkeypatch):
+    session = requests.Session()
+    session.mount(Service.domain, NoStatusAdapter())
+    monkeypatch.setattr(Service, 'session', session)
+    monkeypatch.setattr(Service, 'throttle', RateLimiter())
+
+    url = f'{Service.domain}codes/id/LEGITEXT000006074069'
+    assert Service().get(url)[0] == url
+    assert Service.throttle.hosts['www.legifrance.gouv.fr'].streak == 1
+
+
+def test_service__set_parser(monkeypatch):
+    monkeypatch.setattr(Service, 'features', None)
+    default = Service.parser_features()
+    assert default in ('lxml', 'html5lib')
+    with pytest.raises(ValueError):
+        Service.set_parser('nonexistent')
+    with pytest.raises(ValueError):
+        make_soup(b'<html></html>', 'nonexistent')
+    assert Service.parser_features() == default
+
+    # Per service class
+    monkeypatch.setattr(LegislatureService, 'features', None)
+    LegislatureService.set_parser('html.parser')
+    assert LegislatureService.parser_features() == 'html.parser'
+    assert Service.parser_features() == default
@@ -0,0 +1,61 @@
+# coding: utf-8
+import json
+
+import pytest
+import vcr
+from click.testing import CliRunner
+
+from legipy.cli import cli
+from legipy.services import Service
+from legipy.services.code_service import CodeService
+from legipy.stats import Stats
+
+recorder = vcr.VCR(cassette_library_dir='tests/fixtures/cassettes')
+
+
+@pytest.fixture(autouse=True)
+def no_parsed_cache(monkeypatch):
+    # Parser outputs found in the cache are not timed
+    monkeypatch.setattr(Service, 'parsed_cache', None)
+
+
+@recorder.use_cassette('test_code_service__code')
+def test_stats__code(monkeypatch):
+    stats = Stats()
+    monkeypatch.setattr(Service, 'stats', stats)
+    CodeService().code('LEGITEXT000006074069', '2018-02-11',
+                       with_articles=True)
+
+    result = stats.to_dict()
+    assert result['requests'] == 1
+    assert result['bytes'] > 0
+    assert result['anti_bot_pages'] == 0
+    assert result['timings']['soup'] > 0
+    parser = result['parsers']['CodeParser.parse_code']
+    assert parser['calls'] == 1
+    assert parser['objects'] > 1
+    assert 'CodeParser.parse_code' in stats.summary()
+
+
+@recorder.use_cassette('test_code_service__codes')
+def test_stats__iterator(monkeypatch):
+    stats = Stats()
+    monkeypatch.setattr(Service, 'stats', stats)
+    codes = CodeService().iter_codes()
+    assert stats.parsers == {}
+
+    assert len(list(codes)) == 105
+    assert stats.parsers['CodeParser.iter_code_list']['objects'] == 105
+
+
+@recorder.use_cassette('test_code_service__codes')
+def test_cli__stats_file(monkeypatch, tmp_path):
+    monkeypatch.setattr(Service, 'stats', None)
+    path = tmp_path / 'stats.json'
+    result = CliRunner().invoke(cli, ['--no-cache', '--no-webdriver',
+                                      '--stats-file', str(path), 'codes'])
+
+    assert result.exit_code == 0
+    stats = json.loads(path.read_text())
+    assert stats['requests'] == 1
+    assert stats['parsers']['CodeParser.iter_code_list']['objects'] == 105
@@ -0,0 +1,43 @@
+# coding: utf-8
+import time
+
+from legipy.services.throttle import RateLimiter
+
+URL = 'https://www.legifrance.gouv.fr/liste/code'
+
+
+def test_throttle__burst():
+    throttle = RateLimiter(rate=1., burst=3)
+    start = time.monotonic()
+    for _ in range(3):
+        throttle.acquire(URL)
+    assert time.monotonic() - start < .5
+
+    throttle.acquire(URL)
+    assert time.monotonic() - start > .5
+
+
+def test_throttle__adaptive_rate():
+    throttle = RateLimiter(rate=2., min_rate=.5, max_rate=3., successes=2)
+
+    throttle.failure(URL)
+    assert throttle.current_rate(URL) == 1.
+    throttle.failure(URL)
+    throttle.failure(URL)
+    assert throttle.current_rate(URL) == .5
+
+    for _ in range(20):
+        throttle.success(URL)
+    assert throttle.current_rate(URL) == 3.
+
+    # Hosts are throttled independently
+    assert throttle.current_rate('https://example.com/') == 2.
+
+
+def test_throttle__refund():
+    throttle = RateLimiter(rate=.1, burst=1)
+    throttle.acquire(URL)
+    throttle.refund(URL)
+    start = time.monotonic()
+    throttle.acquire(URL)
+    assert time.monotonic() - start < .5